@@ -0,0 +1,108 @@
+"""Backtest throughput on a synthetic history database, with a cross-check against live evaluation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_backtest --downloads 2000 --samples 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import utils.backtest
+from utils.batch_rules import compute_metrics
+from utils.history_db import connect
+from utils.queue_cache import CachedRecord
+from utils.queue_item import QueueItem
+from utils.rules import compile_rules
+from utils.speed_history import SpeedHistory
+
+RULES = [
+    (True, {"C1": "30", "C2": "downloading", "C6": "50"}),
+    (True, {"C8": "20", "C7": "100"}),
+]
+
+STATUSES = ["downloading", "queued", "completed"]
+INTERVAL = 300
+
+
+def build_database(path, downloads, samples, seed=0):
+    rng = random.Random(seed)
+    connection = connect(path)
+    connection.executemany("INSERT INTO statuses (id, name) VALUES (?, ?)",
+                           [(i + 1, name) for i, name in enumerate(STATUSES)])
+    start = int(time.time()) - downloads * INTERVAL
+    for id in range(1, downloads + 1):
+        size = rng.randint(1, 8 * 1024 ** 3)
+        added = start + rng.randint(0, downloads) * INTERVAL
+        connection.execute(
+            "INSERT INTO downloads (id, instance, download_id, title, indexer, size, added) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (id, 'default', f'HASH{id:08d}', f'Synthetic.S01E{id:04d}', rng.choice(['alpha', 'beta']), size, added)
+        )
+        rows = []
+        size_left = size
+        speed = rng.lognormvariate(11, 2)
+        for n in range(samples):
+            if rng.random() < 0.1:
+                speed = rng.lognormvariate(11, 2) if rng.random() < 0.7 else 0
+            size_left = max(0, size_left - int(speed * INTERVAL))
+            status = 3 if size_left == 0 else 1
+            rows.append((id, added + (n + 1) * INTERVAL, size_left, status))
+            if size_left == 0:
+                break
+        connection.executemany("INSERT INTO samples (download, ts, sizeleft, status) VALUES (?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+
+
+def live_first_hit(path, download, compiled, recent_window):
+    # 按实时路径（SpeedHistory + compute_metrics）逐样本回放单个下载
+    connection = connect(path)
+    size, added = connection.execute("SELECT size, added FROM downloads WHERE id = ?", (download,)).fetchone()
+    rows = connection.execute(
+        "SELECT s.ts, s.sizeleft, st.name FROM samples s JOIN statuses st ON st.id = s.status"
+        " WHERE s.download = ? ORDER BY s.ts", (download,)
+    ).fetchall()
+    connection.close()
+
+    history = SpeedHistory()
+    iso = datetime.fromtimestamp(added, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    for ts, size_left, status in rows:
+        record = {'id': download, 'added': iso, 'size': size, 'sizeleft': size_left, 'status': status}
+        metrics = compute_metrics(CachedRecord(QueueItem(record)), ts, history, recent_window)
+        if compiled.matches(metrics):
+            return ts
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--downloads', type=int, default=2000)
+    parser.add_argument('--samples', type=int, default=1000)
+    parser.add_argument('--verify', type=int, default=50, help='Downloads to cross-check against live evaluation')
+    args = parser.parse_args()
+
+    compiled = compile_rules(RULES)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history.db')
+        started = time.perf_counter()
+        build_database(path, args.downloads, args.samples)
+        print(f"Built history database in {time.perf_counter() - started:.1f}s")
+
+        report = utils.backtest.backtest(path, compiled)
+        print(f"Replayed {report.samples} samples of {report.downloads} downloads in {report.seconds:.2f}s "
+              f"({report.samples / report.seconds:,.0f} samples/s)")
+        print(f"Would remove {len(report.removals)}, completed later {len(report.completed_later)}")
+
+        removed = {int(r.download_id[4:]): r.removed_at for r in report.removals}
+        mismatches = 0
+        for download in range(1, min(args.verify, args.downloads) + 1):
+            if live_first_hit(path, download, compiled, 600) != removed.get(download):
+                mismatches += 1
+        print(f"Cross-checked {min(args.verify, args.downloads)} downloads, {mismatches} mismatches")
+
+
+if __name__ == '__main__':
+    main()
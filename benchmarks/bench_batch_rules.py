@@ -0,0 +1,102 @@
+"""Scalar vs. NumPy batch rule evaluation over one queue page, with a decision cross-check.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch_rules --records 10000
+"""
+import argparse
+import logging
+import random
+import time
+from dataclasses import replace
+from datetime import datetime, timezone
+
+import utils.batch_rules
+import utils.config
+from handler.auto_delete_task import GuardState, evaluate_record
+from utils.log import Logger
+
+RULES = [
+    (True, {"C1": "30", "C3": "50", "C2": "downloading,queued"}),
+    (True, {"C4": "600", "C5": "90", "C6": "80"}),
+]
+
+STATUSES = ["downloading", "queued", "paused", "completed", "warning"]
+
+
+def synthetic_polls(count, polls, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).timestamp()
+    records = []
+    for id in range(count):
+        size = rng.randint(0, 8 * 1024 ** 3)
+        added = datetime.fromtimestamp(now - rng.uniform(0, 7200), timezone.utc)
+        records.append({
+            'id': id,
+            'title': f'Synthetic.S01E{id:04d}',
+            'added': added.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'size': size,
+            'sizeleft': rng.randint(0, size) if size else 0,
+            'status': rng.choice(STATUSES),
+        })
+
+    result = []
+    for poll in range(polls):
+        timestamp = now + poll * 60
+        page = []
+        for record in records:
+            record = dict(record)
+            record['sizeleft'] = max(0, record['sizeleft'] - rng.randint(0, 50 * 1024 * 60))
+            page.append(record)
+        records = page
+        result.append((timestamp, page))
+    return result
+
+
+
+def run(name, evaluate, polls):
+    state = GuardState()
+    decisions = None
+    start = time.perf_counter()
+    for timestamp, page in polls:
+        entries = [state.snapshot.update(record) for record in page]
+        decisions = evaluate(entries, timestamp, state)
+        state.snapshot.finish(record['id'] for record in page)
+    elapsed = (time.perf_counter() - start) / len(polls)
+    print(f"{name:<8} {len(polls[-1][1])} records in {elapsed * 1000:.1f}ms per page")
+    return decisions
+
+
+def scalar(entries, timestamp, state):
+    results = [evaluate_record(entry, timestamp, state) for entry in entries]
+    return [failed for failed, _ in results], sum(1 for _, near in results if near)
+
+
+def batch(entries, timestamp, state):
+    return utils.batch_rules.evaluate_batch(entries, state.rules, timestamp, state.history,
+                                            state.config.recent_speed_window * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--polls', type=int, default=3)
+    args = parser.parse_args()
+
+    if not utils.batch_rules.available():
+        raise SystemExit("NumPy is not installed, only the scalar path is available")
+
+    Logger.get_logger(level=logging.INFO, console_output=False)
+    utils.config.publish(replace(utils.config.config, rules=RULES))
+
+    polls = synthetic_polls(args.records, args.polls)
+    expected = run('scalar', scalar, polls)
+    actual = run('numpy', batch, polls)
+
+    assert expected == actual, "batch and scalar paths disagree"
+    failures, near = actual
+    print(f"decisions match ({failures.count(0)} of {len(failures)} records selected, {near} near a threshold)")
+
+
+if __name__ == '__main__':
+    main()
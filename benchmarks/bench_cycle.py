@@ -0,0 +1,156 @@
+"""End-to-end guard cycles against the mock Sonarr at several queue sizes.
+
+Drives the real SonarrAPI, iter_queue and analyze_downloads. Each queue size runs in a
+fresh child process next to a fresh mock server, so CPU time and peak RSS belong to the
+guard alone.
+
+    python -m benchmarks.bench_cycle --sizes 100 1000 10000 --cycles 10 --latency 0.01 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+
+import aiohttp
+
+import utils.api
+from benchmarks import mock_sonarr
+from handler.auto_delete_task import GuardState, analyze_downloads, fetch_queue
+from utils.config import Config
+from utils.log import Logger
+
+API_KEY = 'a' * 32
+RULES = [(True, {"C1": 30, "C6": 20})]
+
+
+def serve_mock(port, records, args, ready):
+    async def run():
+        mock = mock_sonarr.MockSonarr(records, median_speed=args.median_speed * 1024, stall_ratio=args.stall_ratio,
+                                      latency=args.latency, latency_jitter=args.latency_jitter,
+                                      error_rate=args.error_rate, compress=not args.no_compression)
+        runner = await mock_sonarr.start(mock, port)
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+async def mock_stats(port):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f'http://127.0.0.1:{port}/_stats') as response:
+            return await response.json()
+
+
+async def run_cycles(port, args):
+    # 状态文件写入临时目录，不污染工作区，也不会影响下一次运行的重新搜索额度
+    with tempfile.TemporaryDirectory() as directory:
+        return await run_cycles_in(port, args, directory)
+
+
+async def run_cycles_in(port, args, directory):
+    config = Config(API_KEY, '127.0.0.1', port, False, 1, RULES, page_size=args.page_size,
+                    fetch_concurrency=args.concurrency, delete_rate_limit=args.delete_rate,
+                    stream_queue=not args.buffered, queue_probe=not args.no_probe,
+                    research_state_file=os.path.join(directory, 'research_budget.json'),
+                    history_db=os.path.join(directory, 'history.db'))
+    state = GuardState('bench', config)
+    latencies = []
+    failures = 0
+    deleted = 0
+
+    async with utils.api.SonarrAPI('127.0.0.1', API_KEY, port=port) as api:
+        before = await mock_stats(port)
+        transfer = api.transfer_totals()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(args.cycles):
+            start = time.perf_counter()
+            try:
+                records = await fetch_queue(api, config, state)
+                summary = await analyze_downloads(api, records, state)
+                deleted += sum(summary.deleted.values())
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        after = await mock_stats(port)
+        received, decoded, decode_seconds = (now - then for now, then in zip(api.transfer_totals(), transfer))
+
+    return {
+        'latencies': latencies,
+        'failures': failures,
+        'deleted': deleted,
+        'requests': after['requests'] - before['requests'],
+        'errors': after['errors'] - before['errors'],
+        'wall': wall,
+        'cpu': cpu,
+        'received': received / args.cycles,
+        'decoded': decoded / args.cycles,
+        'decode_seconds': decode_seconds / args.cycles,
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def guard_process(port, args, results):
+    Logger.get_logger(level=logging.WARNING, console_output=False)
+    results.put(asyncio.run(run_cycles(port, args)))
+
+
+def report(size, result):
+    latencies = sorted(result['latencies'])
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    wall = result['wall']
+    print(f"{size:>6} items  cycle p50 {statistics.median(latencies) * 1000:8.1f}ms  p95 {p95 * 1000:8.1f}ms  "
+          f"{result['requests'] / wall:7.0f} req/s  CPU {result['cpu'] / wall * 100:5.1f}%  "
+          f"peak RSS {result['peak_rss']:6.1f} MiB  "
+          f"{result['received'] / 1024:7.1f} KiB/cycle ({result['decoded'] / 1024:.1f} KiB decoded, "
+          f"{result['decode_seconds'] * 1000:.1f}ms decoding)  "
+          f"deleted {result['deleted']}  failed cycles {result['failures']}  injected errors {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--cycles', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=250)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--delete-rate', type=float, default=5.0, help='delete_rate_limit in requests/s')
+    parser.add_argument('--median-speed', type=float, default=512, help='Median speed in KiB/s')
+    parser.add_argument('--stall-ratio', type=float, default=1 / 3)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock latency per request in seconds')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--buffered', action='store_true', help='Decode whole responses instead of streaming')
+    parser.add_argument('--no-probe', action='store_true', help='Skip the v3/queue/status probe')
+    parser.add_argument('--no-compression', action='store_true', help='Serve queue pages uncompressed')
+    parser.add_argument('--port', type=int, default=19100)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve_mock, args=(args.port, size, args, ready), daemon=True)
+        server.start()
+        ready.wait()
+
+        results = multiprocessing.Queue()
+        guard = multiprocessing.Process(target=guard_process, args=(args.port, args, results))
+        try:
+            guard.start()
+            report(size, results.get())
+            guard.join()
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Many guarded instances served by one supervisor process.
+
+Starts N mock Sonarr servers in a child process, points one guard instance at each and
+runs the supervisor for a fixed time, reporting sweeps, CPU and peak RSS of the guard.
+
+    python -m benchmarks.bench_instances --instances 20 --records 500 --duration 30
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import aiohttp
+
+import utils.config
+from benchmarks import mock_sonarr
+from handler.supervisor import supervise
+from utils.config import Config
+from utils.log import Logger
+
+API_KEY = 'a' * 32
+
+
+def serve_mocks(base_port, count, records, ready):
+    async def run():
+        runners = [await mock_sonarr.start(mock_sonarr.MockSonarr(records, seed=i), base_port + i)
+                   for i in range(count)]
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(run())
+
+
+async def collect_stats(base_port, count):
+    async with aiohttp.ClientSession() as session:
+        stats = []
+        for i in range(count):
+            async with session.get(f'http://127.0.0.1:{base_port + i}/_stats') as response:
+                stats.append(await response.json())
+        return stats
+
+
+async def run_guard(args):
+    # 状态文件写入临时目录，不污染工作区，也不会影响下一次运行
+    with tempfile.TemporaryDirectory() as directory:
+        await run_guard_in(args, directory)
+
+
+async def run_guard_in(args, directory):
+    utils.config.publish(Config(
+        API_KEY, '127.0.0.1', args.base_port, False, 1, [(True, {"C1": 30, "C3": 50})],
+        min_refresh_interval=args.interval,
+        instances=[{'name': f'mock{i}', 'port': args.base_port + i} for i in range(args.instances)],
+        research_state_file=os.path.join(directory, 'research_budget.json'),
+        history_db=os.path.join(directory, 'history.db'),
+    ))
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    task = asyncio.create_task(supervise())
+    await asyncio.sleep(args.duration)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    stats = await collect_stats(args.base_port, args.instances)
+    requests = sum(s['requests'] for s in stats)
+    deleted = sum(s['deleted'] for s in stats)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"instances:   {args.instances} x {args.records} records")
+    print(f"duration:    {wall:.1f}s")
+    print(f"requests:    {requests} ({requests / wall:.0f}/s), {deleted} deletions")
+    print(f"guard CPU:   {cpu:.2f}s ({cpu / wall * 100:.1f}% of one core)")
+    print(f"peak RSS:    {peak_rss:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--instances', type=int, default=20)
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--interval', type=int, default=5, help='min_refresh_interval in seconds')
+    parser.add_argument('--base-port', type=int, default=19000)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_mocks,
+                                     args=(args.base_port, args.instances, args.records, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    Logger.get_logger(level=logging.WARNING, console_output=False)
+    try:
+        asyncio.run(run_guard(args))
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
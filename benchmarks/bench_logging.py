@@ -0,0 +1,66 @@
+"""Per-record logging overhead on the caller thread at INFO level.
+
+Compares the old pattern (eager f-string debug messages, synchronous file and console
+handlers) with lazy %-style/level-guarded messages and queue mode, where formatting and
+I/O happen on a background listener thread.
+
+    python -m benchmarks.bench_logging --records 10000
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from utils.log import Logger
+
+
+def eager(logger, record):
+    logger.debug(f"Download stats for {record['title']}: "
+                 f"Elapsed time: {record['elapsed'] / 60:.2f}min, "
+                 f"Average speed: {record['speed'] / 1024:.2f}KB/s, "
+                 f"Progress: {record['progress']:.2f}%")
+    logger.debug(f"Final rule processing result: {record['delete']}")
+    if record['delete']:
+        logger.info(f"Deleting and re-searching download - ID: {record['id']}, Title: {record['title']}")
+
+
+def lazy(logger, record):
+    if logger.is_enabled_for(logging.DEBUG):
+        logger.debug("Download stats for %s: Elapsed time: %.2fmin, Average speed: %.2fKB/s, Progress: %.2f%%",
+                     record['title'], record['elapsed'] / 60, record['speed'] / 1024, record['progress'])
+    logger.debug("Final rule processing result: %s", record['delete'])
+    if record['delete']:
+        logger.info("Deleting and re-searching download - ID: %s, Title: %s", record['id'], record['title'])
+
+
+def run(name, logger, emit, records):
+    start = time.perf_counter()
+    for record in records:
+        emit(logger, record)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1e6 / len(records):7.2f} us/record")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--delete-ratio', type=float, default=0.1, help='Fraction of records logged at INFO')
+    args = parser.parse_args()
+
+    step = max(1, round(1 / args.delete_ratio)) if args.delete_ratio else 0
+    records = [{'id': i, 'title': f'Synthetic.S01E{i:05d}', 'elapsed': 3600.0 + i, 'speed': 1024.0 * i,
+                'progress': i % 100, 'delete': bool(step) and i % step == 0} for i in range(args.records)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        sync = Logger.get_logger('bench-sync', log_dir=directory, log_file='sync.log', console_output=False)
+        queued = Logger.get_logger('bench-queue', log_dir=directory, log_file='queue.log', console_output=False,
+                                   queue_mode=True)
+        run('eager f-strings, sync I/O', sync, eager, records)
+        run('lazy %-style, sync I/O', sync, lazy, records)
+        run('eager f-strings, queue mode', queued, eager, records)
+        run('lazy %-style, queue mode', queued, lazy, records)
+        Logger.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Memory and access cost of raw queue dicts vs slotted QueueItem objects.
+
+Builds N records the way the mock Sonarr serves them (trimmed to the fields the guard
+reads, as the streamed fetch keeps them) and compares what the snapshot would retain,
+measured with tracemalloc, plus the time of one metrics-style pass over the fields.
+
+    python -m benchmarks.bench_queue_item --records 10000 100000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.mock_sonarr import MockSonarr
+from utils.queue_fetcher import QUEUE_FIELDS
+from utils.queue_item import QueueItem, parse_added
+
+
+def decode_records(count):
+    # 经过一次 JSON 往返，字符串不会与模拟器共享
+    mock = MockSonarr(count)
+    payload = json.dumps([mock.render(record) for record in mock.queue.values()])
+    return [{name: record[name] for name in QUEUE_FIELDS if name in record} for record in json.loads(payload)]
+
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    objects = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size
+
+
+def dict_pass(records, added, now):
+    total = 0.0
+    for record, record_added in zip(records, added):
+        elapsed = now - record_added
+        downloaded = record['size'] - record['sizeleft']
+        if record['status'] == 'downloading' and elapsed > 0:
+            total += downloaded / elapsed
+    return total
+
+
+def item_pass(items, now):
+    total = 0.0
+    for item in items:
+        elapsed = now - item.added
+        downloaded = item.size - item.size_left
+        if item.status == 'downloading' and elapsed > 0:
+            total += downloaded / elapsed
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    for count in args.records:
+        dicts, dict_bytes = retained(lambda: decode_records(count))
+        items, item_bytes = retained(lambda: [QueueItem(record) for record in decode_records(count)])
+
+        now = time.time()
+        # 旧的缓存同样预先解析 added，这里只比较按键查找与按属性访问
+        added = [parse_added(record['added']) for record in dicts]
+        started = time.perf_counter()
+        dict_pass(dicts, added, now)
+        dict_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        item_pass(items, now)
+        item_seconds = time.perf_counter() - started
+
+        print(f"{count:>7} records  dict {dict_bytes / count:6.0f} B/record  "
+              f"QueueItem {item_bytes / count:6.0f} B/record ({item_bytes / dict_bytes * 100:4.1f}%)  "
+              f"pass {dict_seconds * 1000:7.1f}ms -> {item_seconds * 1000:6.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
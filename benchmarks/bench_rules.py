@@ -0,0 +1,112 @@
+"""Evaluating synthetic records with the legacy per-record rule parsing vs. compiled rules.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rules --records 10000
+"""
+import argparse
+import logging
+import random
+import time
+from dataclasses import replace
+
+import utils.config
+from utils.log import Logger
+from utils.rules import Metrics, compile_rules
+
+RULES = [
+    (True, {"C1": "30", "C3": "50", "C2": "downloading,queued"}),
+    (True, {"C4": "600", "C5": "90"}),
+]
+
+STATUSES = ["downloading", "queued", "paused", "completed", "warning"]
+
+
+def legacy_process_rules(elapsed_time, average_speed, status, estimated_time, percentage_downloaded):
+    # 编译前的实现：每条记录重新构建 lambda 并解析阈值（C4/C5 补上 float() 以支持字符串阈值）
+    logger = Logger.get_logger()
+
+    if not utils.config.config.rules:
+        return True
+
+    isFilter = True
+    logger.debug(f"Processing rules for download - "
+                 f"Elapsed time: {elapsed_time/60:.2f}min, "
+                 f"Speed: {average_speed/1024:.2f}KB/s, "
+                 f"Status: {status}, "
+                 f"Est. time: {estimated_time:.2f}min, "
+                 f"Progress: {percentage_downloaded:.2f}%")
+
+    rule_checks = {
+        "C1": lambda x, et: et / 60 > float(x),
+        "C2": lambda x, st: st in x.split(','),
+        "C3": lambda x, as_: as_ < float(x) * 1024,
+        "C4": lambda x, et: float(x) < et,
+        "C5": lambda x, pd: float(x) > pd,
+    }
+    values = {"C1": elapsed_time, "C2": status, "C3": average_speed, "C4": estimated_time, "C5": percentage_downloaded}
+
+    for condition, rule_dict in utils.config.config.rules:
+        if not condition:
+            continue
+
+        for key, value in rule_dict.items():
+            if key in rule_checks:
+                result = rule_checks[key](value, values[key])
+                logger.debug(f"Rule {key} check: {value}, Result: {result}")
+                isFilter = isFilter and result
+
+    logger.debug(f"Final rule processing result: {isFilter}")
+    return isFilter
+
+
+def synthetic_records(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        (
+            rng.uniform(0, 7200),
+            rng.uniform(0, 200 * 1024),
+            rng.choice(STATUSES),
+            rng.uniform(0, 2000),
+            rng.uniform(0, 100),
+        )
+        for _ in range(count)
+    ]
+
+
+def timed(name, func, records, repeat):
+    best = float('inf')
+    decisions = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decisions = [func(*record) for record in records]
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {len(records)} records in {best * 1000:.1f}ms "
+          f"({best / len(records) * 1e6:.2f}us/record)")
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    Logger.get_logger(level=logging.INFO, console_output=False)
+    utils.config.publish(replace(utils.config.config, rules=RULES))
+
+    compiled = compile_rules(RULES)
+
+    def compiled_rules(*record):
+        return compiled.matches(Metrics(*record))
+
+    records = synthetic_records(args.records)
+    before = timed('before', legacy_process_rules, records, args.repeat)
+    after = timed('after', compiled_rules, records, args.repeat)
+
+    assert before == after, "compiled rules disagree with legacy evaluation"
+    print(f"decisions match ({sum(after)} of {len(after)} records selected)")
+
+
+if __name__ == '__main__':
+    main()
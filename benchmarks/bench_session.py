@@ -0,0 +1,59 @@
+"""Requests/sec of SonarrAPI with a per-request session vs. a pooled session.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_session --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+import utils.api
+from benchmarks import mock_sonarr
+from utils.log import Logger
+
+API_KEY = 'a' * 32
+
+
+async def unpooled_get(api):
+    # 旧实现：每个请求新建一个 ClientSession
+    async with aiohttp.ClientSession() as session:
+        async with session.get(api.server_api + 'v3/queue', headers={'X-API-KEY': api.api_key}) as response:
+            return await response.json()
+
+
+async def run(name, call, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {requests} requests in {elapsed:.2f}s -> {requests / elapsed:.0f} req/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--port', type=int, default=18989)
+    args = parser.parse_args()
+
+    Logger.get_logger(level=logging.WARNING, console_output=False)
+    runner = await mock_sonarr.start(mock_sonarr.MockSonarr(0), args.port)
+    try:
+        async with utils.api.SonarrAPI('127.0.0.1', API_KEY, port=args.port) as api:
+            await run('before', lambda: unpooled_get(api), args.requests, args.concurrency)
+            await run('after', lambda: api.get('v3/queue'), args.requests, args.concurrency)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
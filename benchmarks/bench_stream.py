@@ -0,0 +1,92 @@
+"""Peak memory of buffered vs streamed decoding of one large queue response.
+
+Fetches N records (with nested series/episode objects by default) from the mock Sonarr
+through iter_queue and keeps every record, as the queue snapshot does. By default the
+queue is one page; --page-size splits it so later pages are fetched concurrently.
+Each mode runs in a fresh child process so peak RSS is not shared between them.
+
+    python -m benchmarks.bench_stream --records 10000 --page-size 250
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import resource
+import time
+
+import utils.api
+from benchmarks import mock_sonarr
+from utils.log import Logger
+from utils.queue_fetcher import iter_queue
+
+API_KEY = 'a' * 32
+
+
+def serve_mock(port, args, ready):
+    async def run():
+        mock = mock_sonarr.MockSonarr(args.records, details=not args.plain)
+        runner = await mock_sonarr.start(mock, port)
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def fetch(port, args, stream):
+    async with utils.api.SonarrAPI('127.0.0.1', API_KEY, port=port) as api:
+        # 先请求一次小页面，让会话和连接的内存计入基线
+        await api.get('v3/queue', {'page': 1, 'pageSize': 1})
+        baseline = rss_mib()
+        start = time.perf_counter()
+        first = None
+        records = []
+        async for record in iter_queue(api, args.page_size or args.records, stream=stream):
+            if first is None:
+                first = time.perf_counter() - start
+            records.append(record)
+        elapsed = time.perf_counter() - start
+    return {'records': len(records), 'first': first, 'elapsed': elapsed,
+            'baseline': baseline, 'peak': rss_mib()}
+
+
+def fetch_process(port, args, stream, results):
+    Logger.get_logger(level=logging.WARNING, console_output=False)
+    results.put(asyncio.run(fetch(port, args, stream)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--plain', action='store_true', help='Serve records without nested series/episode objects')
+    parser.add_argument('--page-size', type=int, default=0, help='Queue page size (default: one page)')
+    parser.add_argument('--port', type=int, default=19200)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_mock, args=(args.port, args, ready), daemon=True)
+    server.start()
+    ready.wait()
+    try:
+        for name, stream in (('buffered', False), ('streamed', True)):
+            results = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=fetch_process, args=(args.port, args, stream, results))
+            worker.start()
+            result = results.get()
+            worker.join()
+            print(f"{name:>8}  {result['records']} records  first record {result['first'] * 1000:7.1f}ms  "
+                  f"total {result['elapsed'] * 1000:7.1f}ms  "
+                  f"peak RSS {result['peak']:6.1f} MiB (+{result['peak'] - result['baseline']:.1f} MiB)")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""A fake qBittorrent / Transmission / SABnzbd server for exercising the download client adapters.
+
+    python -m benchmarks.fake_download_client --port 8080 --torrents 500
+
+All three APIs are served from the same port, reporting the same synthetic downloads.
+"""
+import argparse
+import random
+import uuid
+
+from aiohttp import web
+
+USERNAME = 'admin'
+PASSWORD = 'adminadmin'
+APIKEY = 'fakeapikey'
+
+
+def synthetic_torrents(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'hash': uuid.UUID(int=rng.getrandbits(128)).hex + f'{i:08x}',
+            'nzo_id': f'SABnzbd_nzo_{i:06d}',
+            'dlspeed': rng.choice([0, rng.randint(1, 5 * 1024 * 1024)]),
+            'num_seeds': rng.randint(0, 50),
+            'num_leechs': rng.randint(0, 50),
+        }
+        for i in range(count)
+    ]
+
+
+def create_app(torrents):
+    session_id = uuid.uuid4().hex
+    sid = uuid.uuid4().hex
+
+    async def qbit_login(request):
+        form = await request.post()
+        if form.get('username') != USERNAME or form.get('password') != PASSWORD:
+            return web.Response(text='Fails.')
+        response = web.Response(text='Ok.')
+        response.set_cookie('SID', sid)
+        return response
+
+    async def qbit_info(request):
+        if request.cookies.get('SID') != sid:
+            return web.Response(status=403, text='Forbidden')
+        return web.json_response([
+            {'hash': t['hash'], 'dlspeed': t['dlspeed'], 'num_seeds': t['num_seeds'],
+             'num_leechs': t['num_leechs'], 'state': 'downloading' if t['dlspeed'] else 'stalledDL'}
+            for t in torrents
+        ])
+
+    async def transmission_rpc(request):
+        if request.headers.get('X-Transmission-Session-Id') != session_id:
+            return web.Response(status=409, headers={'X-Transmission-Session-Id': session_id})
+        return web.json_response({'result': 'success', 'arguments': {'torrents': [
+            {'hashString': t['hash'], 'rateDownload': t['dlspeed'], 'peersSendingToUs': t['num_seeds'],
+             'peersConnected': t['num_seeds'] + t['num_leechs'], 'status': 4}
+            for t in torrents
+        ]}})
+
+    async def sabnzbd_api(request):
+        if request.query.get('apikey') != APIKEY:
+            return web.json_response({'status': False, 'error': 'API Key Incorrect'})
+        slots = [{'nzo_id': t['nzo_id'], 'status': 'Downloading' if i == 0 else 'Queued'}
+                 for i, t in enumerate(torrents)]
+        speed = torrents[0]['dlspeed'] / 1024 if torrents else 0
+        return web.json_response({'queue': {'kbpersec': f'{speed:.2f}', 'slots': slots}})
+
+    app = web.Application()
+    app['torrents'] = torrents
+    app.router.add_post('/api/v2/auth/login', qbit_login)
+    app.router.add_get('/api/v2/torrents/info', qbit_info)
+    app.router.add_post('/transmission/rpc', transmission_rpc)
+    app.router.add_get('/api', sabnzbd_api)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--torrents', type=int, default=100)
+    args = parser.parse_args()
+    web.run_app(create_app(synthetic_torrents(args.torrents)), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
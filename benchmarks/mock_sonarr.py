@@ -0,0 +1,285 @@
+"""A self-contained mock Sonarr serving a synthetic download queue.
+
+    python -m benchmarks.mock_sonarr --port 8989 --records 1000 --latency 0.05 --error-rate 0.01
+
+Any 32-character alphanumeric API key is accepted. Serves paged GET v3/queue,
+DELETE v3/queue/{id} and DELETE v3/queue/bulk; /_stats reports request counters.
+With --details every record carries nested series and episode objects, like
+includeSeries/includeEpisode responses. GET v3/queue/status returns the counts,
+queue pages are gzip-compressed when the client accepts it, and --etag adds
+ETag/If-None-Match handling.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+STATUSES = ['downloading', 'downloading', 'downloading', 'queued', 'paused', 'warning']
+
+
+class MockSonarr:
+    def __init__(
+            self,
+            records: int = 1000,
+            seed: int = 0,
+            median_speed: float = 512 * 1024,
+            speed_sigma: float = 1.5,
+            stall_ratio: float = 1 / 3,
+            latency: float = 0.0,
+            latency_jitter: float = 0.0,
+            error_rate: float = 0.0,
+            details: bool = False,
+            compress: bool = True,
+            etag: bool = False,
+    ):
+        self.rng = random.Random(seed)
+        # 速度分布：一部分下载停滞，其余服从对数正态分布（字节/秒）
+        self.median_speed = median_speed
+        self.speed_sigma = speed_sigma
+        self.stall_ratio = stall_ratio
+        # 注入的响应延迟（秒）与错误率
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.details = details
+        self.compress = compress
+        self.etag = etag
+        self.not_modified = 0
+        self.status_requests = 0
+        self.next_id = 1
+        self.queue = {}
+        self.requests = 0
+        self.errors = 0
+        self.deleted = 0
+        self.bulk_requests = 0
+        self.started_at = time.time()
+        self.ticked_at = self.started_at
+        for _ in range(records):
+            self.add_record()
+
+    def add_record(self):
+        id = self.next_id
+        self.next_id += 1
+        size = self.rng.randint(200, 8000) * 1024 * 1024
+        added = self.started_at - self.rng.uniform(60, 6 * 3600)
+        self.queue[id] = {
+            'id': id,
+            'seriesId': self.rng.randint(1, 200),
+            'episodeId': id,
+            'title': f'Mock.Series.S01E{id:05d}.1080p.WEB.h264',
+            'indexer': self.rng.choice(['IndexerA', 'IndexerB', 'IndexerC']),
+            'downloadId': f'{id:040X}',
+            'protocol': 'torrent',
+            'downloadClient': 'qBittorrent',
+            'status': self.rng.choice(STATUSES),
+            'trackedDownloadState': 'downloading',
+            'size': size,
+            'sizeleft': self.rng.randint(0, size),
+            'speed': self.random_speed(),
+            'added': datetime.fromtimestamp(added, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        return id
+
+    def random_speed(self) -> int:
+        if self.rng.random() < self.stall_ratio:
+            return 0
+        return int(self.median_speed * self.rng.lognormvariate(0, self.speed_sigma))
+
+    async def delay(self):
+        if self.latency or self.latency_jitter:
+            await asyncio.sleep(self.latency + self.rng.uniform(0, self.latency_jitter))
+
+    def fail(self) -> bool:
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def tick(self):
+        # 按经过的时间推进下载进度
+        now = time.time()
+        elapsed = now - self.ticked_at
+        self.ticked_at = now
+        for record in self.queue.values():
+            record['sizeleft'] = max(0, record['sizeleft'] - int(record['speed'] * elapsed))
+
+    def page(self, page: int, page_size: int):
+        self.tick()
+        records = list(self.queue.values())
+        start = (page - 1) * page_size
+        return {
+            'page': page,
+            'pageSize': page_size,
+            'sortKey': 'added',
+            'sortDirection': 'ascending',
+            'totalRecords': len(records),
+            'records': [self.render(r) for r in records[start:start + page_size]],
+        }
+
+    def render(self, record):
+        rendered = {k: v for k, v in record.items() if k != 'speed'}
+        if self.details:
+            rendered['series'] = series_detail(record['seriesId'])
+            rendered['episode'] = episode_detail(record['seriesId'], record['episodeId'])
+        return rendered
+
+    def remove(self, ids, replace=True):
+        removed = 0
+        for id in ids:
+            if self.queue.pop(id, None) is not None:
+                removed += 1
+                if replace:
+                    # 模拟 Sonarr 重新抓取
+                    self.add_record()
+        self.deleted += removed
+        return removed
+
+    def stats(self):
+        return {'records': len(self.queue), 'requests': self.requests, 'errors': self.errors,
+                'deleted': self.deleted, 'bulk_requests': self.bulk_requests,
+                'status_requests': self.status_requests, 'not_modified': self.not_modified}
+
+
+def series_detail(series_id: int):
+    # 与 Sonarr 返回的系列信息大小相近
+    return {
+        'id': series_id,
+        'title': f'Mock Series {series_id}',
+        'sortTitle': f'mock series {series_id}',
+        'status': 'continuing',
+        'overview': 'A synthetic series used to pad queue responses. ' * 8,
+        'network': 'Mock Network',
+        'airTime': '21:00',
+        'images': [{'coverType': kind, 'url': f'/MediaCover/{series_id}/{kind}.jpg',
+                    'remoteUrl': f'https://artworks.example.org/banners/{series_id}/{kind}.jpg'}
+                   for kind in ('banner', 'poster', 'fanart')],
+        'seasons': [{'seasonNumber': number, 'monitored': True} for number in range(1, 6)],
+        'year': 2020,
+        'path': f'/tv/Mock Series {series_id}',
+        'qualityProfileId': 1,
+        'seasonFolder': True,
+        'monitored': True,
+        'tvdbId': 100000 + series_id,
+        'imdbId': f'tt{series_id:07d}',
+        'genres': ['Drama', 'Mystery'],
+        'tags': [],
+        'added': '2020-01-01T00:00:00Z',
+        'ratings': {'votes': 1000, 'value': 8.1},
+    }
+
+
+def episode_detail(series_id: int, episode_id: int):
+    return {
+        'id': episode_id,
+        'seriesId': series_id,
+        'tvdbId': 900000 + episode_id,
+        'episodeFileId': 0,
+        'seasonNumber': 1,
+        'episodeNumber': episode_id % 100,
+        'title': f'Episode {episode_id}',
+        'airDate': '2024-01-01',
+        'airDateUtc': '2024-01-01T21:00:00Z',
+        'overview': 'A synthetic episode used to pad queue responses. ' * 4,
+        'hasFile': False,
+        'monitored': True,
+        'absoluteEpisodeNumber': episode_id,
+        'unverifiedSceneNumbering': False,
+    }
+
+
+def create_app(mock: MockSonarr) -> web.Application:
+    @web.middleware
+    async def check_api_key(request, handler):
+        mock.requests += 1
+        if request.path.startswith('/api/'):
+            api_key = request.headers.get('X-API-KEY', '')
+            if len(api_key) != 32 or not api_key.isalnum():
+                return web.Response(status=401, text='Unauthorized')
+            await mock.delay()
+            if mock.fail():
+                return web.Response(status=503, text='Injected failure')
+        return await handler(request)
+
+    async def get_queue(request):
+        page = int(request.query.get('page', 1))
+        page_size = int(request.query.get('pageSize', 10))
+        body = json.dumps(mock.page(max(1, page), max(1, page_size))).encode()
+        headers = {}
+        if mock.etag:
+            tag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if request.headers.get('If-None-Match') == tag:
+                mock.not_modified += 1
+                return web.Response(status=304, headers={'ETag': tag})
+            headers['ETag'] = tag
+        response = web.Response(body=body, content_type='application/json', headers=headers)
+        if mock.compress:
+            response.enable_compression()
+        return response
+
+    async def get_status(request):
+        mock.status_requests += 1
+        count = len(mock.queue)
+        return web.json_response({'totalCount': count, 'count': count, 'unknownCount': 0, 'errors': False,
+                                  'warnings': False, 'unknownErrors': False, 'unknownWarnings': False})
+
+    async def delete_item(request):
+        if not mock.remove([int(request.match_info['id'])]):
+            return web.Response(status=404, text='Not found')
+        return web.Response()
+
+    async def delete_bulk(request):
+        try:
+            ids = [int(id) for id in (await request.json())['ids']]
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400, text='Invalid body')
+        mock.bulk_requests += 1
+        mock.remove(ids)
+        return web.Response()
+
+    async def get_stats(request):
+        return web.json_response(mock.stats())
+
+    app = web.Application(middlewares=[check_api_key])
+    app['mock'] = mock
+    app.router.add_get('/api/v3/queue', get_queue)
+    app.router.add_get('/api/v3/queue/status', get_status)
+    app.router.add_delete('/api/v3/queue/bulk', delete_bulk)
+    app.router.add_delete(r'/api/v3/queue/{id:\d+}', delete_item)
+    app.router.add_get('/_stats', get_stats)
+    return app
+
+
+async def start(mock: MockSonarr, port: int, host: str = '127.0.0.1') -> web.AppRunner:
+    runner = web.AppRunner(create_app(mock), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8989)
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--median-speed', type=float, default=512, help='Median speed in KiB/s')
+    parser.add_argument('--stall-ratio', type=float, default=1 / 3)
+    parser.add_argument('--latency', type=float, default=0.0, help='Added latency per request in seconds')
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--details', action='store_true', help='Embed series and episode objects in records')
+    parser.add_argument('--no-compression', action='store_true', help='Never compress queue pages')
+    parser.add_argument('--etag', action='store_true', help='Answer conditional queue requests with 304')
+    args = parser.parse_args()
+    mock = MockSonarr(args.records, args.seed, median_speed=args.median_speed * 1024, stall_ratio=args.stall_ratio,
+                      latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                      details=args.details, compress=not args.no_compression, etag=args.etag)
+    web.run_app(create_app(mock), host='127.0.0.1', port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
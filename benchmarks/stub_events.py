@@ -0,0 +1,93 @@
+"""Local stand-ins for Sonarr's push channels, for exercising event mode without a real Sonarr.
+
+Serve a SignalR hub that emits a queue event every few seconds:
+
+    python -m benchmarks.stub_events signalr --port 8989 --interval 5
+
+Post a Sonarr Connect webhook to a running guard:
+
+    python -m benchmarks.stub_events webhook --url http://127.0.0.1:5000/api/webhook --download-id ABC123
+"""
+import argparse
+import asyncio
+import json
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+RECORD_SEPARATOR = '\x1e'
+
+
+def queue_message(download_id=None, action='updated'):
+    body = {'action': action}
+    if download_id:
+        body['resource'] = {'downloadId': download_id}
+    return {'type': 1, 'target': 'receiveMessage', 'arguments': [{'name': 'queue', 'body': body}]}
+
+
+def webhook_payload(event_type='Grab', download_id=None):
+    payload = {'eventType': event_type, 'series': {'id': 1, 'title': 'Stub Series'}, 'episodes': [{'id': 1}]}
+    if download_id:
+        payload['downloadId'] = download_id
+    return payload
+
+
+def create_signalr_app(interval=5.0, download_ids=()):
+    async def negotiate(request):
+        token = uuid.uuid4().hex
+        return web.json_response({'negotiateVersion': 1, 'connectionId': token, 'connectionToken': token,
+                                  'availableTransports': [{'transport': 'WebSockets',
+                                                           'transferFormats': ['Text']}]})
+
+    async def hub(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.receive()  # 握手
+        await ws.send_str('{}' + RECORD_SEPARATOR)
+
+        index = 0
+        while not ws.closed:
+            download_id = download_ids[index % len(download_ids)] if download_ids else None
+            await ws.send_str(json.dumps(queue_message(download_id)) + RECORD_SEPARATOR)
+            request.app['sent'] += 1
+            index += 1
+            await asyncio.sleep(interval)
+        return ws
+
+    app = web.Application()
+    app['sent'] = 0
+    app.router.add_post('/signalr/messages/negotiate', negotiate)
+    app.router.add_get('/signalr/messages', hub)
+    return app
+
+
+async def post_webhook(url, event_type='Grab', download_id=None):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=webhook_payload(event_type, download_id)) as response:
+            return response.status, await response.text()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    signalr = commands.add_parser('signalr')
+    signalr.add_argument('--port', type=int, default=8989)
+    signalr.add_argument('--interval', type=float, default=5.0)
+    signalr.add_argument('--download-id', action='append', default=[])
+
+    webhook = commands.add_parser('webhook')
+    webhook.add_argument('--url', default='http://127.0.0.1:5000/api/webhook')
+    webhook.add_argument('--event', default='Grab')
+    webhook.add_argument('--download-id')
+
+    args = parser.parse_args()
+    if args.command == 'signalr':
+        web.run_app(create_signalr_app(args.interval, args.download_id), host='127.0.0.1', port=args.port)
+    else:
+        print(*asyncio.run(post_webhook(args.url, args.event, args.download_id)))
+
+
+if __name__ == '__main__':
+    main()
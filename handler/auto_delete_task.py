@@ -1,137 +1,467 @@
 import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from typing import Dict, Set, Tuple
 
 import utils.api
+import utils.batch_rules
 import utils.config
+import utils.dashboard
+import utils.event_log
+import utils.history_db
+import utils.metrics
+import utils.research_budget
+from handler.delete_executor import DeleteExecutor
+from utils.download_clients import DownloadClients
+from utils.events import inbox
 from utils.log import Logger
+from utils.queue_cache import QueueSnapshot
+from utils.queue_fetcher import iter_queue, probe_queue
+from utils.rules import MISS_LIMIT, compile_rules
+from utils.scheduler import AdaptiveScheduler
+from utils.signalr import SignalRClient
+from utils.speed_history import SpeedHistory
 
 
-async def handler():
-    logger = Logger.get_logger()
-    logger.info("Starting download monitor handler")
+@dataclass
+class SweepSummary:
+    evaluated: int = 0
+    near: int = 0
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    dirty: int = 0
+    changed: bool = False
+    deleted: Dict[int, bool] = field(default_factory=dict)
+    selected: Dict[int, str] = field(default_factory=dict)
+    researched: Dict[int, Dict] = field(default_factory=dict)
+    deferred: Set[int] = field(default_factory=set)
+    # 本轮的决策，删除请求提交之后才写入历史和事件日志
+    decisions: Dict[int, Tuple] = field(default_factory=dict)
+    rule_seconds: float = 0.0
 
-    while True:
-        try:
-            api = utils.api.SonarrAPI(utils.config.config.host, utils.config.config.apikey)
-            
-            logger.debug("Fetching queue data from API")
-            data = await api.get('v3/queue')
-
-            if 'records' in data:
-                logger.debug(f"Found {len(data['records'])} records in queue")
-                await analyze_downloads(api, data['records'])
-            else:
-                logger.warning("No records found in queue data")
-
-            await asyncio.sleep(utils.config.config.refresh_interval * 60)
-        except Exception as e:
-            logger.error(f"Error in handler: {str(e)}")
-            await asyncio.sleep(60)  # Wait a minute before retrying
 
-async def analyze_downloads(api, records):
+class GuardState:
+    # 单个实例跨轮询保留的状态
+    def __init__(self, name: str = utils.config.DEFAULT_INSTANCE, config=None):
+        self.name = name
+        self.config = None
+        self.rules = None
+        self.history = None
+        self.budget = None
+        # 服务器不支持 v3/queue/status 时不再探测
+        self.probe_supported = True
+        # 服务器不支持批量删除接口时之后直接逐个删除
+        self.bulk_supported = True
+        # 上一轮因额度用完而暂缓删除的记录，只在首次暂缓时记录决策
+        self.deferred = set()
+        self.snapshot = QueueSnapshot()
+        self.set_config(config or utils.config.config)
+
+    def set_config(self, config):
+        if self.config is None or config.rules != self.config.rules:
+            # 实例沿用顶层规则时直接使用配置快照中已编译的规则
+            snapshot = utils.config.current()
+            self.rules = (snapshot.compiled_rules if config.rules == snapshot.config.rules
+                          else compile_rules(config.rules))
+        if self.history is None or (config.speed_history_size, config.ewma_alpha) != (
+                self.history.size, self.history.ewma_alpha):
+            self.history = SpeedHistory(config.speed_history_size, config.ewma_alpha)
+        self.budget = utils.research_budget.get_budget(config.research_state_file)
+        self.config = config
+
+
+async def handler(name: str = utils.config.DEFAULT_INSTANCE):
     logger = Logger.get_logger()
-    logger.info(f"Analyzing {len(records)} downloads")
+    logger.info(f"Starting download monitor handler for instance {name}")
 
-    now = datetime.now(timezone.utc)
-    for record in records:
-        try:
-            added_time = datetime.fromisoformat(record['added'].replace('Z', '+00:00'))
-            elapsed_time = (now - added_time).total_seconds()
+    config = utils.config.instance_config(name)
+    if config is None:
+        logger.warning(f"Instance {name} is not configured")
+        return
+
+    api = None
+    api_settings = None
+    state = GuardState(name, config)
+    scheduler = AdaptiveScheduler(config.refresh_interval * 60)
+    scheduler.bind()
+    utils.config.add_listener(scheduler.wake)
+    subscription = inbox.subscribe(name, scheduler.wake)
+    signalr_task = None
+    clients = None
+    try:
+        while True:
+            config = utils.config.instance_config(name)
+            if config is None:
+                logger.info(f"Instance {name} removed from config, stopping")
+                return
+            state.set_config(config)
 
-            size = record['size']
-            size_left = record['sizeleft']
-            downloaded = size - size_left
+            # 事件模式下轮询只作为低频兜底
+            interval = config.reconcile_interval if config.event_mode else config.refresh_interval
+            scheduler.configure(interval * 60, config.min_refresh_interval, config.max_refresh_interval * 60)
+            started = time.perf_counter()
+            try:
+                previous_api = api
+                api, api_settings = await get_api(api, api_settings, config, name)
+                signalr_task = sync_signalr(signalr_task, api, api is not previous_api, config, name)
 
-            # Calculate speeds
-            average_speed = downloaded / elapsed_time if elapsed_time > 0 else 0
-            recent_speed = 0
+                clients = await get_download_clients(clients, config)
+                client_stats = await clients.fetch_all()
 
-            # Calculate estimated time
-            estimated_time = (size_left / average_speed if average_speed > 0 else 99999999) / 60
+                _, dirty = inbox.drain(subscription)
+                transfer = api.transfer_totals()
+                records = await fetch_queue(api, config, state)
+                summary = await analyze_downloads(api, records, state, dirty, client_stats)
+                record_transfer(api, transfer, name)
+                duration = time.perf_counter() - started
+                utils.metrics.cycle_seconds.observe(duration, name)
+                utils.metrics.cycles.inc(name, 'ok')
+                if utils.event_log.event_log is not None:
+                    utils.event_log.event_log.cycle(name, time.time(), duration, summary)
 
-            # Calculate percentage
-            percentage_downloaded = (downloaded / size) * 100 if size > 0 else 0
+                delay = scheduler.next_delay(busy=summary.changed or summary.near > 0,
+                                             idle=summary.evaluated == 0)
+            except utils.api.CircuitOpenError as e:
+                # 熔断期间不再请求 Sonarr，等到可以探测时再检查
+                logger.warning(f"Skipping check for instance {name}: {str(e)}")
+                utils.metrics.cycles.inc(name, 'skipped')
+                delay = max(e.retry_after, scheduler.min_interval)
+            except Exception as e:
+                logger.error(f"Error in handler for instance {name}: {str(e)}")
+                utils.metrics.cycles.inc(name, 'failed')
+                if utils.event_log.event_log is not None:
+                    utils.event_log.event_log.cycle(name, time.time(), time.perf_counter() - started, error=str(e))
+                delay = scheduler.next_delay(failed=True)
 
-            logger.debug(f"Download stats for {record['title']}: "
-                         f"Elapsed time: {elapsed_time/60:.2f}min, "
-                         f"Average speed: {average_speed/1024:.2f}KB/s, "
-                         f"Estimated time: {estimated_time:.2f}min, "
-                         f"Progress: {percentage_downloaded:.2f}%")
+            await scheduler.sleep(delay)
+    finally:
+        utils.config.remove_listener(scheduler.wake)
+        inbox.unsubscribe(subscription)
+        utils.dashboard.store.remove(name)
+        utils.api.breakers.pop(name, None)
+        utils.metrics.circuit_state.remove(name)
+        if signalr_task is not None:
+            signalr_task.cancel()
+        if clients is not None:
+            await clients.close()
+        if api is not None:
+            await api.close()
 
-            # Check conditions
-            if process_rules(elapsed_time, average_speed, record['status'], estimated_time, percentage_downloaded):
-                logger.info(f"Deleting and re-searching download - "
-                            f"ID: {record['id']}, "
-                            f"Title: {record['title']}, "
-                            f"Status: {record['status']}")
-                await delete_download(api, record['id'])
 
-        except Exception as e:
-            logger.error(f"Error processing record {record.get('id', 'unknown')}: {str(e)}")
+def sync_signalr(task, api, rebuilt, config, name):
+    enabled = config.event_mode and config.signalr
+
+    if task is not None and (rebuilt or not enabled or task.done()):
+        task.cancel()
+        task = None
+
+    if task is None and enabled:
+        Logger.get_logger().info(f"Starting SignalR event listener for instance {name}")
+        task = asyncio.create_task(SignalRClient(api, inbox, name).run())
+    return task
+
+
+async def get_api(api, api_settings, config, name=None):
+    # 仅在连接相关配置变化时重建客户端，其余情况复用已有连接池
+    settings = (config.host, config.port, config.ssl, config.apikey, config.url_base, config.connect_timeout,
+                config.read_timeout, config.request_retries, config.retry_base_delay, config.retry_max_delay,
+                config.breaker_threshold, config.breaker_reset_timeout)
+    if api is not None and settings == api_settings:
+        return api, api_settings
+
+    if api is not None:
+        Logger.get_logger().info("Sonarr connection settings changed, rebuilding API client")
+        await api.close()
+
+    api = utils.api.SonarrAPI(config.host, config.apikey, port=config.port, url_base=config.url_base, ssl=config.ssl,
+                              name=name, connect_timeout=config.connect_timeout, read_timeout=config.read_timeout,
+                              retries=config.request_retries, retry_base_delay=config.retry_base_delay,
+                              retry_max_delay=config.retry_max_delay, breaker_threshold=config.breaker_threshold,
+                              breaker_reset_timeout=config.breaker_reset_timeout)
+    return api, settings
 
 
-async def delete_download(api, id):
+async def fetch_queue(api, config, state):
+    expected = None
+    if config.queue_probe and state.probe_supported:
+        expected = await probe_queue(api, config.include_unknown_items)
+        state.probe_supported = expected is not None
+    return iter_queue(api, config.page_size, config.fetch_concurrency, config.stream_queue, expected,
+                      config.include_unknown_items)
+
+
+def record_transfer(api, before, name):
+    received, decoded, decode_seconds = (now - then for now, then in zip(api.transfer_totals(), before))
+    utils.metrics.cycle_bytes.observe(received, name)
+    utils.metrics.cycle_decode_seconds.observe(decode_seconds, name)
+    Logger.get_logger().debug("Received %d bytes (%d decoded) from %s, %.1fms decoding",
+                              received, decoded, name, decode_seconds * 1000)
+
+
+async def get_download_clients(clients, config):
+    settings = config.download_clients or []
+    timeouts = (config.connect_timeout, config.read_timeout)
+    if clients is not None and (clients.settings, clients.timeouts) == (settings, timeouts):
+        return clients
+
+    if clients is not None:
+        await clients.close()
+    return DownloadClients(settings, connect_timeout=config.connect_timeout, timeout=config.read_timeout)
+
+
+async def analyze_downloads(api, records, state=None, dirty=None, client_stats=None):
     logger = Logger.get_logger()
+    if state is None:
+        state = GuardState()
+    config = state.config
+    logger.info(f"Analyzing downloads for instance {state.name}")
+
+    executor = DeleteExecutor(api, config.delete_batch_size, config.delete_rate_limit, config.delete_concurrency,
+                              use_bulk=state.bulk_supported)
+    history = state.history
+    snapshot = state.snapshot
+
+    timestamp = datetime.now(timezone.utc).timestamp()
+    seen_ids = set()
+    summary = SweepSummary()
+    page = []
+    samples = [] if utils.history_db.store is not None else None
     try:
-        params = {
-            "removeFromClient": "true",
-            "blocklist": "true",
-            "skipRedownload": "false",
-            "changeCategory": "false"
+        async for record in records:
+            seen_ids.add(record.get('id'))
+            try:
+                # 只有新增或变化的记录才重新解析
+                entry = snapshot.update(record)
+                download_key = str(entry.item.download_id or '').upper()
+                if client_stats:
+                    entry.client = client_stats.get(download_key)
+                if dirty and download_key in dirty:
+                    entry.changed = True
+                    summary.dirty += 1
+                page.append(entry)
+                if samples is not None:
+                    samples.append(history_row(entry))
+            except Exception as e:
+                logger.error(f"Error processing record {record.get('id', 'unknown')}: {str(e)}")
+                continue
+
+            if len(page) >= config.page_size:
+                process_page(executor, summary, page, timestamp, state)
+                page = []
+
+        process_page(executor, summary, page, timestamp, state)
+
+        diff = snapshot.finish(seen_ids)
+        history.retain(seen_ids)
+        summary.evaluated = len(seen_ids)
+        summary.added = len(diff.added)
+        summary.updated = len(diff.changed)
+        summary.removed = len(diff.removed)
+        summary.changed = bool(diff.added or diff.removed)
+        if samples is not None:
+            utils.history_db.store.record_samples(state.name, timestamp, samples)
+        logger.info(f"Analyzed {summary.evaluated} downloads for instance {state.name} "
+                    f"({summary.added} new, {summary.updated} changed, {summary.removed} removed, "
+                    f"{summary.dirty} from events), "
+                    f"{summary.near} about to reach a time-based rule threshold")
+        summary.deleted = await executor.flush()
+    finally:
+        # 拉取中途失败时没有提交任何删除，settle_budget 会退回本轮预占的全部额度
+        settle_budget(summary, timestamp, state)
+    state.bulk_supported = executor.use_bulk
+    state.deferred = summary.deferred
+    record_decisions(summary, timestamp, state)
+    record_metrics(summary, state)
+    # 面板数据需要逐条重新计算，只在有人查看时发布
+    if config.dashboard and utils.dashboard.store.wanted(state.name):
+        publish_dashboard(summary, timestamp, state)
+    return summary
+
+
+def process_page(executor, summary, page, timestamp, state):
+    started = time.perf_counter()
+    selected, near = evaluate_page(page, timestamp, state)
+    summary.rule_seconds += time.perf_counter() - started
+    summary.near += near
+    for entry in selected:
+        item = entry.item
+        decision = state.budget.decide(state.name, item, timestamp, state.config)
+        if decision == utils.research_budget.DEFER:
+            if item.id not in state.deferred:
+                summary.decisions[item.id] = (entry, 'defer')
+            summary.deferred.add(item.id)
+            continue
+        research = decision == utils.research_budget.RESEARCH
+        summary.decisions[item.id] = (entry, 'delete' if research else 'delete_skip')
+        summary.selected[item.id] = item.status
+        if research:
+            # 先预占额度，同一剧集在本轮的其他记录会看到这次删除
+            state.budget.record(state.name, item, timestamp)
+            summary.researched[item.id] = item
+        queue_delete(executor, item, research)
+
+
+def record_decisions(summary, timestamp, state):
+    # 只记录实际提交了删除请求的记录（成功与否都记录），以及首次暂缓的记录
+    for id, (entry, action) in summary.decisions.items():
+        if action == 'defer' or id in summary.deleted:
+            record_decision(entry, timestamp, state, action)
+
+
+def settle_budget(summary, timestamp, state):
+    budget = state.budget
+    for id, item in summary.researched.items():
+        if not summary.deleted.get(id):
+            budget.release(state.name, item, timestamp)
+    budget.prune(state.name, timestamp, state.config.research_window_hours * 3600)
+    budget.save()
+
+
+def record_metrics(summary, state):
+    name = state.name
+    rule = rule_label(state)
+    utils.metrics.rule_seconds.observe(summary.rule_seconds, name)
+    utils.metrics.evaluated.inc(name, amount=summary.evaluated)
+    utils.metrics.queue_depth.set(summary.evaluated, name)
+    stalled = sum(1 for ring in state.history.rings.values() if ring.stall_time() >= utils.metrics.STALL_SECONDS)
+    utils.metrics.stalled_items.set(stalled, name)
+    utils.metrics.last_sweep.set(time.time(), name)
+    for id, success in summary.deleted.items():
+        if success:
+            utils.metrics.deletions.inc(name, rule, summary.selected.get(id, ''))
+        else:
+            utils.metrics.delete_failures.inc(name)
+
+
+def publish_dashboard(summary, timestamp, state):
+    rows = {}
+    recent_window = state.config.recent_speed_window * 60
+    for id, entry in state.snapshot.entries.items():
+        item = entry.item
+        # 速度历史本轮已写入，同一时间戳的重复写入会被忽略
+        metrics = utils.batch_rules.compute_metrics(entry, timestamp, state.history, recent_window)
+        failed, closest, closeness = state.rules.closest(metrics)
+        rows[id] = {
+            'id': id,
+            'title': item.title,
+            'indexer': item.indexer,
+            'status': item.status,
+            'added': int(item.added),
+            'size': item.size,
+            'sizeleft': item.size_left,
+            'progress': round(metrics.percentage_downloaded, 1),
+            'speed': int(metrics.recent_speed),
+            'eta': None if metrics.estimated_time >= utils.batch_rules.NO_ETA / 60 else coarse_minutes(
+                metrics.estimated_time),
+            'failing': failed,
+            'closest': closest,
+            # 随时间变化的字段粗略取整，避免每轮都把所有记录当作变化推送
+            'closeness': round(closeness, 1),
         }
-        logger.debug(f"Attempting to delete download with ID: {id}")
-        await api.delete('v3/queue/' + str(id), params)
-        logger.info(f"Successfully deleted download with ID: {id}")
-    except Exception as e:
-        logger.error(f"Failed to delete download with ID {id}: {str(e)}")
 
+    rule = rule_label(state)
+    deletions = []
+    for id, success in summary.deleted.items():
+        entry = state.snapshot.entries.get(id)
+        item = entry.item if entry is not None else None
+        deletions.append({'ts': int(timestamp), 'id': id, 'title': item.title if item else None,
+                          'indexer': item.indexer if item else None, 'status': summary.selected.get(id),
+                          'rule': rule, 'success': success})
+    utils.dashboard.store.publish(state.name, rows, deletions, timestamp)
+
+
+def coarse_minutes(minutes):
+    if minutes < 10:
+        return round(minutes)
+    step = 5 if minutes < 120 else 30
+    return int(round(minutes / step) * step)
+
+
+def rule_label(state):
+    return '+'.join(check.key for check in state.rules.checks) or 'none'
+
+
+def history_row(entry):
+    item = entry.item
+    download_id = item.download_id or str(item.id)
+    return (download_id, item.title, item.indexer, item.size, int(item.added), item.size_left, item.status)
+
+
+def record_decision(entry, timestamp, state, action):
+    store = utils.history_db.store
+    event_log = utils.event_log.event_log
+    if store is None and event_log is None:
+        return
 
-def process_rules(elapsed_time, average_speed, status, estimated_time, percentage_downloaded):
+    # 只对命中的少量记录重新计算指标；速度历史已在本轮写入，重复写入会被忽略
+    metrics = utils.batch_rules.compute_metrics(entry, timestamp, state.history, state.config.recent_speed_window * 60)
+    inputs = {key: (None if value != value else value) for key, value in metrics._asdict().items()}
+    rule = rule_label(state)
+    if store is not None:
+        store.record_decision(state.name, timestamp, history_row(entry), action, rule, inputs)
+    if event_log is not None:
+        event_log.decision(state.name, timestamp, entry.item, inputs, rule, action)
+
+
+def queue_delete(executor, item, research=True):
     logger = Logger.get_logger()
+    logger.info(f"{'Deleting and re-searching' if research else 'Deleting without re-search'} download - "
+                f"ID: {item.id}, "
+                f"Title: {item.title}, "
+                f"Status: {item.status}")
+    executor.add(item.id, skip_redownload=not research)
 
-    if not utils.config.config.rules:
-        logger.debug("No rules configured, returning True")
-        return True
-
-    isFilter = True
-    logger.debug(f"Processing rules for download - "
-                 f"Elapsed time: {elapsed_time/60:.2f}min, "
-                 f"Speed: {average_speed/1024:.2f}KB/s, "
-                 f"Status: {status}, "
-                 f"Est. time: {estimated_time:.2f}min, "
-                 f"Progress: {percentage_downloaded:.2f}%")
-
-    rule_checks = {
-        "C1": lambda x, et: et / 60 > float(x),
-        "C2": lambda x, st: st in x.split(','),
-        "C3": lambda x, as_: as_ < float(x) * 1024,
-        "C4": lambda x, et: x < et,
-        "C5": lambda x, pd: x > pd,
-    }
-
-    for condition, rule_dict in utils.config.config.rules:
-        if not condition:
-            continue
 
-        for key, value in rule_dict.items():
-            if key in rule_checks:
-                result = False
-                if key == "C1":
-                    result = rule_checks[key](value, elapsed_time)
-                    logger.debug(f"Rule C1 check: {value}min threshold, Result: {result}")
-                elif key == "C2":
-                    result = rule_checks[key](value, status)
-                    logger.debug(f"Rule C2 check: status in {value}, Result: {result}")
-                elif key == "C3":
-                    result = rule_checks[key](value, average_speed)
-                    logger.debug(f"Rule C3 check: speed < {value}KB/s, Result: {result}")
-                elif key == "C4":
-                    result = rule_checks[key](value, estimated_time)
-                    logger.debug(f"Rule C4 check: est. time > {value}min, Result: {result}")
-                elif key == "C5":
-                    result = rule_checks[key](value, percentage_downloaded)
-                    logger.debug(f"Rule C5 check: progress < {value}%, Result: {result}")
-                isFilter = isFilter and result
-
-    logger.debug(f"Final rule processing result: {isFilter}")
-    return isFilter
\ No newline at end of file
+def evaluate_page(entries, timestamp, state):
+    # 返回需要删除的记录，以及随时间推移即将被删除的记录数量
+    if not entries:
+        return [], 0
+
+    failures = None
+    if utils.batch_rules.available():
+        try:
+            failures, near = utils.batch_rules.evaluate_batch(entries, state.rules, timestamp, state.history,
+                                                              state.config.recent_speed_window * 60)
+        except Exception as e:
+            Logger.get_logger().warning(f"Batch evaluation failed, evaluating records one by one: {str(e)}")
+
+    if failures is None:
+        results = [evaluate_record(entry, timestamp, state) for entry in entries]
+        failures = [failed for failed, _ in results]
+        near = sum(1 for _, is_near in results if is_near)
+
+    selected = [entry for entry, failed in zip(entries, failures) if failed == 0]
+    return selected, near
+
+
+def evaluate_record(entry, timestamp, state):
+    logger = Logger.get_logger()
+    item = entry.item
+    try:
+        metrics = utils.batch_rules.compute_metrics(entry, timestamp, state.history,
+                                                    state.config.recent_speed_window * 60)
+
+        # 逐条记录的调试日志先检查级别，INFO 级别下不做任何格式化
+        if entry.changed and logger.is_enabled_for(logging.DEBUG):
+            logger.debug("Download stats for %s: "
+                         "Elapsed time: %.2fmin, "
+                         "Average speed: %.2fKB/s, "
+                         "Recent speed: %.2fKB/s, "
+                         "EWMA speed: %.2fKB/s, "
+                         "Stalled: %.2fmin, "
+                         "Estimated time: %.2fmin, "
+                         "Progress: %.2f%%",
+                         item.title, metrics.elapsed_time / 60, metrics.average_speed / 1024,
+                         metrics.recent_speed / 1024, metrics.ewma_speed / 1024, metrics.stall_time / 60,
+                         metrics.estimated_time, metrics.percentage_downloaded)
+
+        failed = state.rules.failures(metrics)
+        logger.debug("Final rule processing result: %s", failed == 0)
+        return failed, failed == 1 and state.rules.near(metrics)
+    except Exception as e:
+        logger.error(f"Error processing record {item.id}: {str(e)}")
+        return MISS_LIMIT, False
+
@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify, request
+
+import utils.backtest
+import utils.config
+from utils.log import Logger
+from utils.rules import compile_rules
+
+backtest_routes = Blueprint('backtest', __name__)
+
+
+@backtest_routes.route('/api/backtest', methods=['POST'])
+def run_backtest():
+    logger = Logger.get_logger()
+
+    if not utils.backtest.available():
+        return jsonify({'error': 'backtesting requires numpy'}), 503
+
+    payload = request.get_json(silent=True) or {}
+    config = utils.config.config
+    rules = payload.get('rules', config.rules)
+    if not isinstance(rules, list):
+        return jsonify({'error': 'invalid rules'}), 400
+
+    try:
+        report = utils.backtest.backtest(
+            config.history_db,
+            compile_rules(rules),
+            payload.get('instance') or None,
+            payload.get('days'),
+            config.recent_speed_window * 60,
+            config.speed_history_size,
+            config.ewma_alpha,
+        )
+    except Exception as e:
+        logger.error(f"Backtest failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    logger.info(f"Backtest replayed {report.samples} samples, {len(report.removals)} would be removed")
+    return jsonify(report.to_dict(int(payload.get('limit', 100))))
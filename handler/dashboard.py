@@ -0,0 +1,248 @@
+from flask import Blueprint, Response, jsonify, request
+
+import utils.config
+import utils.dashboard
+from handler.web_ui import render_cached
+from utils.events import inbox
+
+dashboard_routes = Blueprint('dashboard', __name__)
+
+TEXTS = {
+    'title': '下载队列',
+    'instance': '实例',
+    'updated': '更新时间',
+    'title_column': '标题',
+    'indexer': '索引器',
+    'status': '状态',
+    'progress': '进度',
+    'speed': '近期速度',
+    'eta': '剩余时间',
+    'closest': '最接近触发的条件',
+    'failing': '未满足条件数',
+    'deleted': '最近删除',
+    'failed': '删除失败',
+    'empty': '暂无数据，等待下一轮检查',
+}
+
+TEMPLATE = """
+<html>
+
+<head>
+    <meta charset="utf-8">
+    <title>{{ texts['title'] }}</title>
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f0f2f5;
+        }
+
+        .container {
+            background-color: #ffffff;
+            padding: 30px;
+            border-radius: 12px;
+            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
+            max-width: 1200px;
+            margin: auto;
+        }
+
+        h1, h2 {
+            color: #333;
+        }
+
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 14px;
+        }
+
+        th, td {
+            text-align: left;
+            padding: 6px 8px;
+            border-bottom: 1px solid #eee;
+        }
+
+        .bar {
+            background-color: #e9ecef;
+            border-radius: 4px;
+            height: 8px;
+            width: 100px;
+        }
+
+        .bar div {
+            background-color: #007bff;
+            border-radius: 4px;
+            height: 8px;
+        }
+
+        .near {
+            color: #dc3545;
+            font-weight: bold;
+        }
+
+        .muted {
+            color: #888;
+        }
+    </style>
+</head>
+
+<body>
+    <div class="container">
+        <h1>{{ texts['title'] }}</h1>
+        <label>{{ texts['instance'] }}
+            <select id="instance" onchange="connect(this.value)">
+                {% for name in instances %}
+                <option value="{{ name }}" {% if name == instance %}selected{% endif %}>{{ name }}</option>
+                {% endfor %}
+            </select>
+        </label>
+        <span class="muted">{{ texts['updated'] }}: <span id="updated">-</span></span>
+
+        <table>
+            <thead>
+                <tr>
+                    <th>{{ texts['title_column'] }}</th>
+                    <th>{{ texts['indexer'] }}</th>
+                    <th>{{ texts['status'] }}</th>
+                    <th>{{ texts['progress'] }}</th>
+                    <th>{{ texts['speed'] }}</th>
+                    <th>{{ texts['eta'] }}</th>
+                    <th>{{ texts['failing'] }}</th>
+                    <th>{{ texts['closest'] }}</th>
+                </tr>
+            </thead>
+            <tbody id="queue"></tbody>
+        </table>
+
+        <h2>{{ texts['deleted'] }}</h2>
+        <table>
+            <tbody id="deleted"></tbody>
+        </table>
+    </div>
+
+    <script>
+        const texts = {{ texts | tojson | safe }};
+        let source = null;
+        let items = new Map();
+        let deleted = [];
+        let pending = false;
+
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value == null ? '' : String(value);
+            return div.innerHTML;
+        }
+
+        function formatSpeed(bytes) {
+            return (bytes / 1024).toFixed(1) + ' KB/s';
+        }
+
+        function formatTime(ts) {
+            return new Date(ts * 1000).toLocaleString();
+        }
+
+        function render() {
+            pending = false;
+            // 越接近删除的排在越前面
+            const rows = Array.from(items.values()).sort((a, b) =>
+                (a.failing - b.failing) || (b.closeness - a.closeness));
+            document.getElementById('queue').innerHTML = rows.length ? rows.map(item => `
+                <tr>
+                    <td>${escapeHtml(item.title)}</td>
+                    <td>${escapeHtml(item.indexer)}</td>
+                    <td>${escapeHtml(item.status)}</td>
+                    <td><div class="bar"><div style="width: ${item.progress}%"></div></div>${item.progress}%</td>
+                    <td>${formatSpeed(item.speed)}</td>
+                    <td>${item.eta == null ? '-' : item.eta + ' min'}</td>
+                    <td class="${item.failing <= 1 ? 'near' : ''}">${item.failing}</td>
+                    <td>${item.closest ? escapeHtml(item.closest) + ' (' + Math.round(item.closeness * 100) + '%)' : '-'}</td>
+                </tr>`).join('') : `<tr><td class="muted">${texts.empty}</td></tr>`;
+            document.getElementById('deleted').innerHTML = deleted.map(item => `
+                <tr>
+                    <td>${formatTime(item.ts)}</td>
+                    <td>${escapeHtml(item.title)}</td>
+                    <td>${escapeHtml(item.indexer)}</td>
+                    <td>${escapeHtml(item.status)}</td>
+                    <td>${escapeHtml(item.rule)}</td>
+                    <td>${item.success ? '' : texts.failed}</td>
+                </tr>`).join('');
+        }
+
+        function schedule(ts) {
+            document.getElementById('updated').textContent = formatTime(ts);
+            if (!pending) {
+                pending = true;
+                requestAnimationFrame(render);
+            }
+        }
+
+        function connect(instance) {
+            if (source) {
+                source.close();
+            }
+            source = new EventSource('/api/queue/events?instance=' + encodeURIComponent(instance));
+            source.addEventListener('snapshot', event => {
+                const data = JSON.parse(event.data);
+                items = new Map(data.items.map(item => [item.id, item]));
+                deleted = data.deleted.slice().reverse();
+                schedule(data.ts);
+            });
+            source.addEventListener('diff', event => {
+                const data = JSON.parse(event.data);
+                data.upsert.forEach(item => items.set(item.id, item));
+                data.remove.forEach(id => items.delete(id));
+                deleted = data.deleted.slice().reverse().concat(deleted).slice(0, 50);
+                schedule(data.ts);
+            });
+        }
+
+        connect(document.getElementById('instance').value);
+    </script>
+</body>
+
+</html>
+"""
+
+
+def selected_instance() -> str:
+    return request.args.get('instance') or utils.config.DEFAULT_INSTANCE
+
+
+def request_refresh(instance: str):
+    # 无人读取时监控循环不发布面板数据；重新有人读取时立即触发一轮检查
+    if utils.dashboard.store.touch(instance):
+        inbox.mark(instance=instance)
+
+
+@dashboard_routes.route('/dashboard', methods=['GET'])
+def dashboard():
+    instances = utils.dashboard.store.instances() or list(utils.config.instance_configs())
+    instance = selected_instance()
+    if instance not in instances and instances:
+        instance = instances[0]
+    return render_cached(TEMPLATE, instances=instances, instance=instance, texts=TEXTS)
+
+
+@dashboard_routes.route('/api/queue', methods=['GET'])
+def queue():
+    instance = selected_instance()
+    request_refresh(instance)
+    snapshot = utils.dashboard.store.snapshot(instance)
+    if snapshot is None:
+        return jsonify({'error': 'no data for instance'}), 404
+    return Response(snapshot, mimetype='application/json')
+
+
+@dashboard_routes.route('/api/queue/events', methods=['GET'])
+def queue_events():
+    instance = selected_instance()
+    request_refresh(instance)
+    try:
+        # 浏览器重连时带上最后收到的版本号，只补发之后的增量
+        version = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        version = None
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    stream = utils.dashboard.store.stream(instance, version, max_streams=utils.config.config.dashboard_streams)
+    return Response(stream, mimetype='text/event-stream', headers=headers)
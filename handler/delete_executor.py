@@ -0,0 +1,112 @@
+import asyncio
+from typing import Dict, List, Set
+
+import utils.metrics
+from utils.api import SonarrAPIError
+from utils.log import Logger
+from utils.rate_limit import TokenBucket
+
+DELETE_PARAMS = {
+    "removeFromClient": "true",
+    "blocklist": "true",
+    "skipRedownload": "false",
+    "changeCategory": "false"
+}
+
+# 重新搜索额度用完时：仍然删除并加入黑名单，但不立即触发搜索
+SKIP_REDOWNLOAD_PARAMS = {**DELETE_PARAMS, "skipRedownload": "true"}
+
+
+class DeleteExecutor:
+    def __init__(
+            self,
+            api,
+            batch_size: int = 50,
+            rate_limit: float = 5.0,
+            concurrency: int = 4,
+            use_bulk: bool = True,
+    ):
+        self.api = api
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.use_bulk = use_bulk
+        self.bucket = TokenBucket(rate_limit, self.concurrency)
+        self.pending: List[int] = []
+        self.skip_redownload: Set[int] = set()
+
+    def add(self, id, skip_redownload: bool = False):
+        self.pending.append(id)
+        if skip_redownload:
+            self.skip_redownload.add(id)
+
+    async def flush(self) -> Dict[int, bool]:
+        logger = Logger.get_logger()
+
+        ids = list(dict.fromkeys(self.pending))
+        skip = self.skip_redownload
+        self.pending = []
+        self.skip_redownload = set()
+        results: Dict[int, bool] = {}
+        if not ids:
+            return results
+
+        logger.info(f"Removing {len(ids)} downloads from queue ({len(skip)} without re-search)")
+        # 是否重新搜索是整个请求的参数，按参数分组后再分批
+        groups = (([id for id in ids if id not in skip], DELETE_PARAMS),
+                  ([id for id in ids if id in skip], SKIP_REDOWNLOAD_PARAMS))
+        for group, params in groups:
+            for start in range(0, len(group), self.batch_size):
+                batch = group[start:start + self.batch_size]
+                if self.use_bulk and await self._delete_bulk(batch, params):
+                    results.update((id, True) for id in batch)
+                else:
+                    results.update(await self._delete_each(batch, params))
+
+        for id, success in results.items():
+            if success:
+                logger.info(f"Successfully deleted download with ID: {id}")
+        failed = [id for id, success in results.items() if not success]
+        if failed:
+            logger.warning(f"Failed to delete {len(failed)} downloads: {failed}")
+        return results
+
+    async def _delete_bulk(self, ids, params=DELETE_PARAMS) -> bool:
+        logger = Logger.get_logger()
+        try:
+            await self.bucket.acquire()
+            logger.debug("Attempting bulk delete of IDs: %s", ids)
+            with utils.metrics.delete_seconds.time('bulk'):
+                await self.api.delete('v3/queue/bulk', params, body={'ids': ids})
+            return True
+        except SonarrAPIError as e:
+            if e.status in (404, 405):
+                # 旧版本 Sonarr 没有批量接口，之后直接逐个删除
+                logger.warning("Bulk remove endpoint not supported, using per-id deletes")
+                self.use_bulk = False
+            else:
+                logger.warning(f"Bulk delete failed, falling back to per-id deletes: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Bulk delete failed, falling back to per-id deletes: {str(e)}")
+        return False
+
+    async def _delete_each(self, ids, params=DELETE_PARAMS) -> Dict[int, bool]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def delete_one(id):
+            async with semaphore:
+                await self.bucket.acquire()
+                return id, await delete_download(self.api, id, params)
+
+        return dict(await asyncio.gather(*(delete_one(id) for id in ids)))
+
+
+async def delete_download(api, id, params=DELETE_PARAMS) -> bool:
+    logger = Logger.get_logger()
+    try:
+        logger.debug("Attempting to delete download with ID: %s", id)
+        with utils.metrics.delete_seconds.time('single'):
+            await api.delete('v3/queue/' + str(id), params)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to delete download with ID {id}: {str(e)}")
+        return False
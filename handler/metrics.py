@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+
+import utils.metrics
+
+metrics_routes = Blueprint('metrics', __name__)
+
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(utils.metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+import utils.config
+import utils.event_log
+import utils.history_db
+from handler.auto_delete_task import handler
+from utils.log import Logger
+
+RESTART_DELAY = 30
+
+
+async def run_instance(name: str):
+    # 单个实例异常退出不影响其他实例，等待后重启
+    logger = Logger.get_logger()
+    while True:
+        try:
+            await handler(name)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Instance {name} crashed: {str(e)}, restarting in {RESTART_DELAY}s")
+            await asyncio.sleep(RESTART_DELAY)
+
+
+async def supervise():
+    logger = Logger.get_logger()
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_config_change():
+        loop.call_soon_threadsafe(changed.set)
+
+    utils.config.add_listener(on_config_change)
+    config = utils.config.config
+    utils.history_db.open_store(config.history_db, config.history_retention_days, config.history_downsample_hours)
+    utils.event_log.open_log(config.event_log, config.event_log_format)
+    tasks: Dict[str, asyncio.Task] = {}
+    try:
+        while True:
+            names = set(utils.config.current().instances)
+
+            for name in [name for name, task in tasks.items() if name not in names or task.done()]:
+                tasks.pop(name).cancel()
+
+            for name in names - set(tasks):
+                logger.info(f"Supervisor starting instance {name}")
+                tasks[name] = asyncio.create_task(run_instance(name), name=f"guard-{name}")
+
+            await changed.wait()
+            changed.clear()
+    finally:
+        utils.config.remove_listener(on_config_change)
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        # 写线程退出前会刷完剩余记录，放到线程池中等待以免阻塞事件循环
+        await loop.run_in_executor(None, utils.history_db.close_store)
+        await loop.run_in_executor(None, utils.event_log.close_log)
+
+
+class Monitor:
+    # 在独立线程的事件循环中运行 supervise()，可以从其他线程启动和干净地停止
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        self.thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='monitor', daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        logger = Logger.get_logger()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(supervise())
+        self._ready.set()
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Monitor stopped unexpectedly: {str(e)}")
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def stop(self, timeout: float = 30):
+        if self.thread is None:
+            return
+        Logger.get_logger().info("Stopping download monitor")
+        try:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        except RuntimeError:
+            # 事件循环已经结束
+            pass
+        self.thread.join(timeout)
+        self.thread = None
@@ -1,96 +1,65 @@
 import json
+from dataclasses import asdict
 from typing import Dict, Tuple, List, Optional
 
-from flask import Blueprint, render_template_string, request
+from flask import Blueprint, current_app, request
 
+import utils.api
 import utils.config
 
 main_routes = Blueprint('main', __name__)
 
-
-@main_routes.route('/', methods=['GET', 'POST'])
-def index():
-    message = ""
-    category = ""
-    if request.method == 'POST':
-        apikey = request.form.get('apikey', '').strip()
-        host = request.form.get('host', '').strip()
-        port = request.form.get('port', '8989').strip()
-        ssl = request.form.get('ssl', 'false') == 'true'
-        refresh_interval = request.form.get('refresh_interval', '5').strip()
-
-        rules: Optional[List[Tuple[bool, Dict]]] = json.loads(request.form.get('rules', '').strip())
-        
-        # 输入验证
-        errors = []
-        if not apikey:
-            errors.append("API Key 不能为空。")
-        if not host:
-            errors.append("Host 不能为空。")
-        if not port.isdigit():
-            errors.append("Port 必须是数字。")
-        if not refresh_interval.isdigit():
-            errors.append("Refresh Interval 必须是数字。")
-
-        if errors:
-            message = " ".join(errors)
-            category = "error"
-        else:
-            # 更新配置
-            new_config_data = {
-                "apikey": apikey,
-                "host": host,
-                "port": int(port),
-                "ssl": ssl,
-                "rules": rules,
-                "refresh_interval": int(refresh_interval)
-            }
-
-            utils.config.update_config(new_config_data)
-            message = "配置已成功更新！"
-            category = "success"
-
-    apikey = utils.config.config.apikey
-    host = utils.config.config.host
-    port = utils.config.config.port
-    ssl = utils.config.config.ssl
-    rules = utils.config.config.rules
-    refresh_interval = utils.config.config.refresh_interval
-
-    texts = {
-        'title': 'Sonarr 自动删除慢速下载',
-        'submit': '提交',
-    
-        # Confirmations and Alerts
-        'delete_warning': '确定要删除这条规则吗？',
-    
-        # Rules Management
-        'add_rule': '添加新规则',
-        'edit': '编辑',
-        'delete': '删除',
-    
-        # Rule Details
-        'downloaded_time': '已下载时间',
-        'status': '状态',
-        'avg_speed': '平均下载速度',
-        'estimated_time': '预计剩余时间',
-        'progress': '下载进度',
-    
-        # Rule Field Labels (used in the modal)
-        'downloaded_time_label': 'C1: 下载时间超过以下分钟',
-        'status_label': 'C2: 当状态包含以下（用逗号分隔）',
-        'avg_speed_label': 'C3: 平均下载速度低于以下值（kb/s）',
-        'estimated_time_label': 'C4: 预计下载时间超过以下值（分钟）',
-        'progress_label': 'C5: 下载百分比小于以下值(0～100)',
-    
-        # Modal
-        'edit_rule_modal_title': '编辑规则',
-        'save_button': '保存',
-        'cancel_button': '取消'
-    }
-
-
-    template = """
+TEXTS = {
+    'title': 'Sonarr 自动删除慢速下载',
+    'submit': '提交',
+
+    # Confirmations and Alerts
+    'delete_warning': '确定要删除这条规则吗？',
+
+    # Rules Management
+    'add_rule': '添加新规则',
+    'edit': '编辑',
+    'delete': '删除',
+
+    # Rule Details
+    'downloaded_time': '已下载时间',
+    'status': '状态',
+    'avg_speed': '平均下载速度',
+    'estimated_time': '预计剩余时间',
+    'progress': '下载进度',
+    'recent_speed': '近期下载速度',
+    'ewma_speed': '平滑下载速度',
+    'stall_time': '无进度时间',
+    'client_speed': '下载器实时速度',
+    'client_seeds': '已连接做种数',
+
+    # Rule Field Labels (used in the modal)
+    'downloaded_time_label': 'C1: 下载时间超过以下分钟',
+    'status_label': 'C2: 当状态包含以下（用逗号分隔）',
+    'avg_speed_label': 'C3: 平均下载速度低于以下值（kb/s）',
+    'estimated_time_label': 'C4: 预计下载时间超过以下值（分钟）',
+    'progress_label': 'C5: 下载百分比小于以下值(0～100)',
+    'recent_speed_label': 'C6: 近期下载速度低于以下值（kb/s）',
+    'ewma_speed_label': 'C7: 平滑下载速度（EWMA）低于以下值（kb/s）',
+    'stall_time_label': 'C8: 无下载进度超过以下分钟',
+    'client_speed_label': 'C9: 下载器实时速度低于以下值（kb/s，需配置下载器）',
+    'client_seeds_label': 'C10: 已连接做种数少于以下值（需配置下载器）',
+
+    # Connection Status
+    'connection': 'Sonarr 连接状态',
+    'breaker_closed': '正常',
+    'breaker_half_open': '探测中',
+    'breaker_open': '已熔断',
+    'failures': '连续失败',
+    'retry_after': '秒后重试',
+
+    # Modal
+    'edit_rule_modal_title': '编辑规则',
+    'save_button': '保存',
+    'cancel_button': '取消'
+}
+
+TEMPLATE = """
     <html>
 
 <head>
@@ -170,6 +139,28 @@ def index():
             color: #155724;
         }
 
+        .breaker {
+            margin: 4px 0;
+            padding: 6px 10px;
+            border-radius: 5px;
+            font-size: 14px;
+        }
+
+        .breaker.closed {
+            background-color: #d4edda;
+            color: #155724;
+        }
+
+        .breaker.half_open {
+            background-color: #fff3cd;
+            color: #856404;
+        }
+
+        .breaker.open {
+            background-color: #f8d7da;
+            color: #721c24;
+        }
+
         @keyframes fadeIn {
             from {
                 opacity: 0;
@@ -321,20 +312,30 @@ def index():
     let currentEditIndex = -1;
 
     // 常量定义
-    const RULE_FIELDS = ['C1', 'C2', 'C3', 'C4', 'C5'];
+    const RULE_FIELDS = ['C1', 'C2', 'C3', 'C4', 'C5', 'C6', 'C7', 'C8', 'C9', 'C10'];
     const FIELD_LABELS = {
         'C1': 'downloaded_time',
         'C2': 'status',
         'C3': 'avg_speed',
         'C4': 'estimated_time',
-        'C5': 'progress'
+        'C5': 'progress',
+        'C6': 'recent_speed',
+        'C7': 'ewma_speed',
+        'C8': 'stall_time',
+        'C9': 'client_speed',
+        'C10': 'client_seeds'
     };
     const FIELD_UNITS = {
         'C1': 'min',
         'C2': '',
         'C3': 'kb/s',
         'C4': 'min',
-        'C5': '%'
+        'C5': '%',
+        'C6': 'kb/s',
+        'C7': 'kb/s',
+        'C8': 'min',
+        'C9': 'kb/s',
+        'C10': ''
     };
 
     // 工具函数
@@ -500,6 +501,18 @@ def index():
 <body>
     <div class="form-container">
         <h1>{{ texts['title'] }}</h1>
+        {% if breakers %}
+        <div class="breakers">
+            <label>{{ texts['connection'] }}</label>
+            {% for breaker in breakers %}
+            <div class="breaker {{ breaker['state'] }}">
+                {{ breaker['name'] }}: {{ texts['breaker_' ~ breaker['state']] }}
+                {% if breaker['failures'] %}（{{ texts['failures'] }} {{ breaker['failures'] }}{% if breaker['last_error'] %}：{{ breaker['last_error'] }}{% endif %}）{% endif %}
+                {% if breaker['retry_after'] %}{{ breaker['retry_after'] | round | int }} {{ texts['retry_after'] }}{% endif %}
+            </div>
+            {% endfor %}
+        </div>
+        {% endif %}
         {% if message %}
         <div class="message {{ category }}">{{ message }}</div>
         {% endif %}
@@ -540,6 +553,16 @@ def index():
                             {{ texts['estimated_time'] }}: {{ value }}分钟
                             {% elif key == 'C5' %}
                             {{ texts['progress'] }}: {{ value }}%
+                            {% elif key == 'C6' %}
+                            {{ texts['recent_speed'] }}: {{ value }}kb/s
+                            {% elif key == 'C7' %}
+                            {{ texts['ewma_speed'] }}: {{ value }}kb/s
+                            {% elif key == 'C8' %}
+                            {{ texts['stall_time'] }}: {{ value }}分钟
+                            {% elif key == 'C9' %}
+                            {{ texts['client_speed'] }}: {{ value }}kb/s
+                            {% elif key == 'C10' %}
+                            {{ texts['client_seeds'] }}: {{ value }}
                             {% endif %}
                         </div>
                         {% endfor %}
@@ -587,6 +610,31 @@ def index():
                 <input type="number" id="C5" min="0" max="100" class="form-control">
             </div>
 
+            <div class="form-group">
+                <label>{{ texts['recent_speed_label'] }}</label>
+                <input type="number" id="C6" min="0" class="form-control">
+            </div>
+
+            <div class="form-group">
+                <label>{{ texts['ewma_speed_label'] }}</label>
+                <input type="number" id="C7" min="0" class="form-control">
+            </div>
+
+            <div class="form-group">
+                <label>{{ texts['stall_time_label'] }}</label>
+                <input type="number" id="C8" min="0" class="form-control">
+            </div>
+
+            <div class="form-group">
+                <label>{{ texts['client_speed_label'] }}</label>
+                <input type="number" id="C9" min="0" class="form-control">
+            </div>
+
+            <div class="form-group">
+                <label>{{ texts['client_seeds_label'] }}</label>
+                <input type="number" id="C10" min="0" class="form-control">
+            </div>
+
             <div class="modal-footer">
                 <button class="btn btn-secondary" onclick="closeModal()">{{ texts['cancel_button'] }}</button>
                 <button class="btn btn-primary" onclick="saveRule()">{{ texts['save_button'] }}</button>
@@ -597,10 +645,74 @@ def index():
 </body>
 
 </html>
-    """
+"""
+
+_templates = {}
+
+
+def render_cached(source: str, **context):
+    # 模板只编译一次，之后每次请求直接渲染
+    template = _templates.get(source)
+    if template is None:
+        template = _templates[source] = current_app.jinja_env.from_string(source)
+    current_app.update_template_context(context)
+    return template.render(context)
+
+
+@main_routes.route('/', methods=['GET', 'POST'])
+def index():
+    message = ""
+    category = ""
+    if request.method == 'POST':
+        apikey = request.form.get('apikey', '').strip()
+        host = request.form.get('host', '').strip()
+        port = request.form.get('port', '8989').strip()
+        ssl = request.form.get('ssl', 'false') == 'true'
+        refresh_interval = request.form.get('refresh_interval', '5').strip()
+
+        rules: Optional[List[Tuple[bool, Dict]]] = json.loads(request.form.get('rules', '').strip())
+        
+        # 输入验证
+        errors = []
+        if not apikey:
+            errors.append("API Key 不能为空。")
+        if not host:
+            errors.append("Host 不能为空。")
+        if not port.isdigit():
+            errors.append("Port 必须是数字。")
+        if not refresh_interval.isdigit():
+            errors.append("Refresh Interval 必须是数字。")
+
+        if errors:
+            message = " ".join(errors)
+            category = "error"
+        else:
+            # 更新配置
+            # 保留网页表单中没有的高级配置项
+            new_config_data = {
+                **asdict(utils.config.config),
+                "apikey": apikey,
+                "host": host,
+                "port": int(port),
+                "ssl": ssl,
+                "rules": rules,
+                "refresh_interval": int(refresh_interval)
+            }
+
+            utils.config.update_config(new_config_data)
+            message = "配置已成功更新！"
+            category = "success"
+
+    config = utils.config.config
+    apikey = config.apikey
+    host = config.host
+    port = config.port
+    ssl = config.ssl
+    rules = config.rules
+    refresh_interval = config.refresh_interval
 
-    return render_template_string(
-        template,
+    return render_cached(
+        TEMPLATE,
         apikey=apikey,
         host=host,
         port=port,
@@ -609,5 +721,6 @@ def index():
         refresh_interval=refresh_interval,
         message=message,
         category=category,
-        texts=texts
+        breakers=[breaker.describe() for breaker in list(utils.api.breakers.values())],
+        texts=TEXTS
     )
@@ -0,0 +1,38 @@
+from flask import Blueprint, jsonify, request
+
+import utils.config
+from utils.events import inbox
+from utils.log import Logger
+
+event_routes = Blueprint('events', __name__)
+
+# 这些事件意味着队列发生了变化
+QUEUE_EVENTS = {'Grab', 'Download', 'DownloadFailure', 'ManualInteractionRequired', 'EpisodeFileDelete'}
+
+
+@event_routes.route('/api/webhook', methods=['POST'])
+def webhook():
+    logger = Logger.get_logger()
+
+    token = utils.config.config.webhook_token
+    if token and request.args.get('token') != token:
+        logger.warning("Rejected webhook with invalid token")
+        return jsonify({'error': 'invalid token'}), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'invalid payload'}), 400
+
+    event_type = payload.get('eventType', '')
+    logger.debug(f"Received webhook event: {event_type}")
+
+    if event_type == 'Test':
+        return jsonify({'status': 'ok'})
+
+    if event_type in QUEUE_EVENTS:
+        # 多实例时可通过 ?instance=<name> 指定来源实例
+        download_id = payload.get('downloadId')
+        inbox.mark([download_id] if download_id else [], request.args.get('instance') or None)
+        logger.info(f"Webhook {event_type} marked download {download_id or 'unknown'} for evaluation")
+
+    return jsonify({'status': 'ok'})
@@ -1,30 +1,67 @@
-import asyncio
-import threading
+import signal
+import sys
 
 from flask import Flask
 
-import handler.auto_delete_task
 import utils.config
+from handler.backtest import backtest_routes
+from handler.dashboard import dashboard_routes
+from handler.metrics import metrics_routes
+from handler.supervisor import Monitor
 from handler.web_ui import main_routes
+from handler.webhook import event_routes
+from utils.config_watcher import ConfigWatcher
+from utils.log import Logger
 
+try:
+    import waitress
+except ImportError:  # waitress 是可选依赖，缺失时使用 Flask 自带的服务器
+    waitress = None
 
-def run_async_handler():
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(handler.auto_delete_task.handler())
+
+def serve(config):
+    logger = Logger.get_logger()
+    if config.web_server == 'waitress' and waitress is not None:
+        logger.info(f"Serving web UI with waitress on {config.web_host}:{config.web_port} "
+                    f"({config.web_threads} threads)")
+        waitress.serve(app, host=config.web_host, port=config.web_port, threads=config.web_threads)
+        return
+
+    if config.web_server == 'waitress':
+        logger.warning("waitress is not installed, falling back to the development server")
+    # 不启用调试器和重载器，否则监控线程会在重载进程中再启动一份
+    app.run(host=config.web_host, port=config.web_port, threaded=True, debug=False, use_reloader=False)
 
 
 def main():
+    # 日志写入交给后台线程，避免阻塞事件循环
+    Logger.get_logger(queue_mode=True)
     utils.config.load_config()
 
-    background_thread = threading.Thread(target=run_async_handler, daemon=True)
-    background_thread.start()
+    # SIGTERM 转为 SystemExit，使监控任务能走完清理流程
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # 配置文件变化时热加载，无需重启
+    watcher = ConfigWatcher(utils.config.config_file_path, lambda: utils.config.load_config(reload=True))
+    watcher.start()
 
-    app.run(host='0.0.0.0',debug=True)
+    monitor = Monitor()
+    monitor.start()
+    try:
+        serve(utils.config.config)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        monitor.stop()
 
 
 app = Flask(__name__)
 app.register_blueprint(main_routes)
+app.register_blueprint(dashboard_routes)
+app.register_blueprint(metrics_routes)
+app.register_blueprint(event_routes)
+app.register_blueprint(backtest_routes)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,115 @@
+import asyncio
+import json
+import random
+import time
+import zlib
 import aiohttp
+from contextlib import asynccontextmanager
+from typing import Dict, NamedTuple, Optional, Tuple
 from urllib.parse import urlencode
 
+import utils.json_stream
+import utils.metrics
+from utils.circuit_breaker import STATE_VALUES, CircuitBreaker
 from utils.log import Logger
 
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，缺失时只接受 gzip/deflate
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+STREAM_CHUNK_SIZE = 64 * 1024
+ACCEPT_ENCODING = 'gzip, br' if brotli is not None else 'gzip'
+# 条件请求缓存的 URL 数量上限
+CONDITIONAL_CACHE_LIMIT = 128
+
+# 只有幂等请求会在网络错误、超时或这些状态码时重试
+IDEMPOTENT_METHODS = frozenset({'GET', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# 每个实例的熔断器，供日志之外的 Web 界面查看
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+class SonarrAPIError(ValueError):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(SonarrAPIError):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'Circuit breaker for {name} is open, retrying in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+def retryable(error: Exception) -> bool:
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, SonarrAPIError):
+        return error.status in RETRY_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class _Cached(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    payload: object
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        decoder = brotli.Decompressor()
+        self._process = getattr(decoder, 'process', None) or decoder.decompress
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._process(data)
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def decompressor(encoding: str):
+    # 自行解压而不是交给 aiohttp，才能统计实际传输的字节数
+    encoding = encoding.strip().lower()
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    if encoding == 'br' and brotli is not None:
+        return _BrotliDecoder()
+    if encoding in ('', 'identity'):
+        return None
+    raise SonarrAPIError(f'Unsupported Content-Encoding: {encoding}')
+
+
+def inflate(decoder, chunk: bytes):
+    # 压缩率很高时一块数据能解压出几十倍的内容，按块大小分段产出以限制内存峰值
+    if decoder is None:
+        yield chunk
+        return
+    if not hasattr(decoder, 'unconsumed_tail'):
+        data = decoder.decompress(chunk)
+        if data:
+            yield data
+        return
+    while chunk:
+        data = decoder.decompress(chunk, STREAM_CHUNK_SIZE)
+        if data:
+            yield data
+        chunk = decoder.unconsumed_tail
+
+
+def backoff_delays(base: float, cap: float):
+    # 去相关抖动：每次在 [base, 上次 * 3] 之间随机取值，避免多个客户端同时重试
+    delay = base
+    while True:
+        delay = min(cap, random.uniform(base, delay * 3))
+        yield delay
+
 
 class SonarrAPI:
     def __init__(
@@ -12,6 +119,17 @@ class SonarrAPI:
             port: int = 8989,
             url_base: str = '',
             ssl: bool = False,
+            connection_limit: int = 10,
+            keepalive_timeout: float = 60,
+            dns_cache_ttl: int = 300,
+            name: Optional[str] = None,
+            connect_timeout: float = 10,
+            read_timeout: float = 30,
+            retries: int = 2,
+            retry_base_delay: float = 0.5,
+            retry_max_delay: float = 10,
+            breaker_threshold: int = 5,
+            breaker_reset_timeout: float = 30,
     ):
         logger = Logger.get_logger()
         logger.info("Initializing SonarrAPI")
@@ -32,51 +150,302 @@ class SonarrAPI:
 
         self.server_url = f"http{'s' if ssl else ''}://{self.hostname}:{self.port}{self.url_base}"
         self.server_api = f"{self.server_url}api/"
-        logger.info(f"SonarrAPI initialized with server URL: {self.server_url}")
 
-    async def _request(self, actions):
-        logger = Logger.get_logger()
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        # 不设总超时：流式读取大队列时只限制连接和两次读取之间的间隔
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.retries = max(0, retries)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.name = name or self.server_url
+        self.breaker = breakers[self.name] = CircuitBreaker(self.name, breaker_threshold, breaker_reset_timeout)
+        utils.metrics.circuit_state.set(STATE_VALUES[self.breaker.state], self.name)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # ETag/Last-Modified 与上次的响应内容，按完整 URL 保存；流式请求另外带上解析参数
+        self._conditional: Dict[object, _Cached] = {}
+        # 累计的传输字节数（解压前/后）、等待网络的时间和解压、解析耗时，按轮询取差值
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.read_seconds = 0.0
+        self.decode_seconds = 0.0
+        logger.info(f"SonarrAPI initialized with server URL: {self.server_url}")
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 会话在首次请求时创建，保证绑定到正在运行的事件循环
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._get_session()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            logger = Logger.get_logger()
+            logger.debug(f"Closing HTTP session for {self.server_url}")
+            await self._session.close()
+        self._session = None
+
+    def _url(self, actions) -> str:
         api_url = self.server_api + actions['relativeUrl']
         if actions.get('parameters') and actions['method'] != 'POST':
             api_url += '?' + urlencode(actions['parameters'])
+        return api_url
+
+    def transfer_totals(self) -> Tuple[int, int, float]:
+        return self.bytes_received, self.bytes_decoded, self.decode_seconds
+
+    @asynccontextmanager
+    async def _response(self, actions, cached: Optional[_Cached] = None):
+        logger = Logger.get_logger()
+
+        api_url = self._url(actions)
 
         headers = {
-            'X-API-KEY': self.api_key
+            'X-API-KEY': self.api_key,
+            'Accept-Encoding': ACCEPT_ENCODING,
         }
 
+        # 只有 POST、PUT 把参数作为请求体发送；GET、DELETE 的参数已在查询字符串中
+        body = actions.get('body')
+        if body is None and actions['method'] in ('POST', 'PUT'):
+            body = actions.get('parameters')
+
         if actions['method'] == 'GET':
             headers['Accept'] = 'application/json'
-        else:
+        if body is not None:
             headers['Content-Type'] = 'application/json'
 
-        logger.debug(f"Making {actions['method']} request to: {api_url}")
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
 
+        logger.debug("Making %s request to: %s", actions['method'], api_url)
+
+        method = actions['method']
+        endpoint = utils.metrics.endpoint_label(actions['relativeUrl'])
+        breaker = self.breaker
+        if not breaker.allow():
+            raise CircuitOpenError(self.name, breaker.retry_after())
+
+        start = time.perf_counter()
+        status = 'network'
+        # 服务器给出响应（5xx 除外）即视为实例可用，不必等响应体读完
+        resolved = False
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.request(actions['method'], api_url, headers=headers, json=actions.get('parameters'), ssl=self.ssl) as response:
-                    if response.status == 401:
-                        logger.error(f"Unauthorized: Invalid API Key for URL: {api_url}")
-                        raise ValueError('Unauthorized: Invalid API Key')
+            session = self._get_session()
+            async with session.request(actions['method'], api_url, headers=headers, json=body, ssl=self.ssl,
+                                       timeout=self.timeout, auto_decompress=False) as response:
+                status = response.status
+                resolved = True
+                if response.status >= 500:
+                    breaker.failure(f'HTTP {response.status}')
+                else:
+                    breaker.success()
+
+                if response.status == 401:
+                    logger.error(f"Unauthorized: Invalid API Key for URL: {api_url}")
+                    raise SonarrAPIError('Unauthorized: Invalid API Key', response.status)
+
+                if response.status == 304 and cached is not None:
+                    logger.debug("Not modified: %s", api_url)
+                    utils.metrics.not_modified.inc(endpoint)
+                    status = 200
+                elif response.status != 200:
+                    error_text = (await self._read_body(response, endpoint)).decode('utf-8', 'replace')
+                    logger.error(f"Request failed with status {response.status}: {error_text}")
+                    raise SonarrAPIError(f'Error: Status {response.status}', response.status)
+
+                # 耗时包含读取响应体的时间
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or type(e).__name__
+            logger.error(f"Network error during request: {error}")
+            if status == 200:
+                status = 'network'
+            breaker.failure(error)
+            resolved = True
+            raise
+        finally:
+            if not resolved:
+                breaker.abort()
+            utils.metrics.circuit_state.set(STATE_VALUES[breaker.state], self.name)
+            utils.metrics.request_seconds.observe(time.perf_counter() - start, method, endpoint)
+            if status != 200:
+                utils.metrics.request_errors.inc(method, endpoint, status)
+
+    async def _chunks(self, response, endpoint: str):
+        # 逐块读取并解压响应体，同时统计传输量和等待网络的时间
+        encoding = response.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+        decoder = decompressor(encoding)
+        stream = response.content
+        received = decoded = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                chunk = await stream.readany()
+                self.read_seconds += time.perf_counter() - started
+                if not chunk:
+                    break
+                received += len(chunk)
+                for data in inflate(decoder, chunk):
+                    decoded += len(data)
+                    yield data
+            if decoder is not None:
+                data = decoder.flush()
+                if data:
+                    decoded += len(data)
+                    yield data
+        finally:
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+            utils.metrics.response_bytes.inc(endpoint, encoding, amount=received)
+            utils.metrics.decoded_bytes.inc(endpoint, amount=decoded)
+
+    async def _read_body(self, response, endpoint: str) -> bytes:
+        return b''.join([chunk async for chunk in self._chunks(response, endpoint)])
+
+    def _remember(self, url, response, payload):
+        # 只有服务器提供了校验信息时才缓存内容
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            self._conditional.pop(url, None)
+            return
+        if len(self._conditional) >= CONDITIONAL_CACHE_LIMIT and url not in self._conditional:
+            self._conditional.clear()
+        self._conditional[url] = _Cached(etag, last_modified, payload)
+
+    async def _retry(self, method: str, relative_url: str, attempt: int, delays, error: Exception) -> bool:
+        # 返回 True 表示等待后重试，False 表示放弃并抛出原异常
+        if method not in IDEMPOTENT_METHODS or attempt >= self.retries or not retryable(error):
+            return False
+        delay = next(delays)
+        Logger.get_logger().warning(f"{method} {relative_url} failed ({str(error) or type(error).__name__}), "
+                                    f"retrying in {delay:.1f}s (attempt {attempt + 2}/{self.retries + 1})")
+        utils.metrics.request_retries.inc(method, utils.metrics.endpoint_label(relative_url))
+        await asyncio.sleep(delay)
+        return True
+
+    async def _request(self, actions):
+        logger = Logger.get_logger()
 
-                    if response.status == 200 and 'application/json' not in response.headers.get('Content-Type', ''):
+        url = self._url(actions)
+        endpoint = utils.metrics.endpoint_label(actions['relativeUrl'])
+        delays = backoff_delays(self.retry_base_delay, self.retry_max_delay)
+        attempt = 0
+        while True:
+            cached = self._conditional.get(url) if actions['method'] == 'GET' else None
+            try:
+                async with self._response(actions, cached) as response:
+                    if response.status == 304:
+                        return cached.payload
+
+                    if 'application/json' not in response.headers.get('Content-Type', ''):
                         logger.debug("Request successful (non-JSON response)")
                         return "success"
 
-                    if response.status == 200:
-                        logger.debug("Request successful with JSON response")
-                        return await response.json()
+                    logger.debug("Request successful with JSON response")
+                    read_seconds = self.read_seconds
+                    started = time.perf_counter()
+                    data = json.loads(await self._read_body(response, endpoint))
+                    self.decode_seconds += time.perf_counter() - started - (self.read_seconds - read_seconds)
+                    if actions['method'] == 'GET':
+                        self._remember(url, response, data)
+                    return data
+            except Exception as e:
+                # 重试的 DELETE 返回 404：之前的请求已经生效，只是响应在超时或 5xx 中丢失
+                if attempt and actions['method'] == 'DELETE' and isinstance(e, SonarrAPIError) and e.status == 404:
+                    logger.info(f"DELETE {actions['relativeUrl']} returned 404 on retry, treating it as already deleted")
+                    return "success"
+                if not await self._retry(actions['method'], actions['relativeUrl'], attempt, delays, e):
+                    raise
+                attempt += 1
+
+    async def stream(self, relative_url, parameters=None, key='records', fields=None, envelope=None):
+        # 边接收边解析 key 数组中的记录，不在内存中构建完整的响应；
+        # fields 不为空时每条记录只保留这些字段
+        logger = Logger.get_logger()
+        logger.debug("Preparing streamed GET request to %s", relative_url)
+
+        if parameters is not None and not isinstance(parameters, dict):
+            logger.error("Invalid parameters type")
+            raise TypeError('Parameters must be type object')
 
-                    error_text = await response.text()
-                    logger.error(f"Request failed with status {response.status}: {error_text}")
-                    raise ValueError(f'Error: Status {response.status}')
-        except aiohttp.ClientError as e:
-            logger.error(f"Network error during request: {str(e)}")
-            raise
+        actions = {
+            'relativeUrl': relative_url,
+            'method': 'GET',
+            'parameters': parameters
+        }
+
+        url = (self._url(actions), key, tuple(fields) if fields is not None else None)
+        endpoint = utils.metrics.endpoint_label(relative_url)
+        delays = backoff_delays(self.retry_base_delay, self.retry_max_delay)
+        attempt = 0
+        while True:
+            cached = self._conditional.get(url)
+            yielded = False
+            try:
+                async with self._response(actions, cached) as response:
+                    if response.status == 304:
+                        items, fields_seen = cached.payload
+                        if envelope is not None:
+                            envelope.update(fields_seen)
+                        for item in items:
+                            yielded = True
+                            yield item
+                        return
+
+                    # 服务器支持条件请求时才保留本次的记录，用于之后的 304 响应
+                    keep = [] if response.headers.get('ETag') or response.headers.get('Last-Modified') else None
+                    fields_seen = {} if envelope is None else envelope
+                    items = utils.json_stream.iter_array(self._chunks(response, endpoint), key, fields_seen).__aiter__()
+                    while True:
+                        read_seconds = self.read_seconds
+                        started = time.perf_counter()
+                        try:
+                            item = await items.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            self.decode_seconds += time.perf_counter() - started - (self.read_seconds - read_seconds)
+                        if fields is not None and isinstance(item, dict):
+                            item = {name: item[name] for name in fields if name in item}
+                        if keep is not None:
+                            keep.append(item)
+                        yielded = True
+                        yield item
+                    if keep is not None:
+                        self._remember(url, response, (keep, dict(fields_seen)))
+                    else:
+                        self._conditional.pop(url, None)
+                return
+            except Exception as e:
+                # 已经交出的记录无法撤回，只有在第一条记录之前失败才重试
+                if yielded or not await self._retry('GET', relative_url, attempt, delays, e):
+                    raise
+                attempt += 1
 
     async def get(self, relative_url, parameters=None):
         logger = Logger.get_logger()
-        logger.debug(f"Preparing GET request to {relative_url}")
+        logger.debug("Preparing GET request to %s", relative_url)
 
         if relative_url is None:
             logger.error("Relative URL is not set")
@@ -96,7 +465,7 @@ class SonarrAPI:
 
     async def post(self, relative_url, parameters=None):
         logger = Logger.get_logger()
-        logger.debug(f"Preparing POST request to {relative_url}")
+        logger.debug("Preparing POST request to %s", relative_url)
 
         if relative_url is None:
             logger.error("Relative URL is not set")
@@ -116,7 +485,7 @@ class SonarrAPI:
 
     async def put(self, relative_url, parameters=None):
         logger = Logger.get_logger()
-        logger.debug(f"Preparing PUT request to {relative_url}")
+        logger.debug("Preparing PUT request to %s", relative_url)
 
         if relative_url is None:
             logger.error("Relative URL is not set")
@@ -134,9 +503,9 @@ class SonarrAPI:
 
         return await self._request(actions)
 
-    async def delete(self, relative_url, parameters=None):
+    async def delete(self, relative_url, parameters=None, body=None):
         logger = Logger.get_logger()
-        logger.debug(f"Preparing DELETE request to {relative_url}")
+        logger.debug("Preparing DELETE request to %s", relative_url)
 
         if relative_url is None:
             logger.error("Relative URL is not set")
@@ -149,7 +518,8 @@ class SonarrAPI:
         actions = {
             'relativeUrl': relative_url,
             'method': 'DELETE',
-            'parameters': parameters
+            'parameters': parameters,
+            'body': body
         }
 
         return await self._request(actions)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import argparse
+import json
+import sqlite3
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.batch_rules import NAN, NO_ETA, evaluate_columns
+from utils.rules import CompiledRules, compile_rules
+
+try:
+    import numpy as np
+except ImportError:  # 回测依赖 NumPy 做整段向量化计算
+    np = None
+
+CHUNK_DOWNLOADS = 500
+COMPLETED_STATUSES = ('completed',)
+
+
+class Removal(NamedTuple):
+    download_id: str
+    title: str
+    indexer: str
+    added: int
+    removed_at: int
+    completed_at: Optional[int]
+    deleted_at: Optional[int]
+
+
+@dataclass
+class BacktestReport:
+    downloads: int = 0
+    samples: int = 0
+    actual_deletions: int = 0
+    removals: List[Removal] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def completed_later(self) -> List[Removal]:
+        # 候选规则会删除、但实际上最终下载完成的任务
+        return [r for r in self.removals if r.completed_at is not None and r.completed_at >= r.removed_at]
+
+    @property
+    def lead_times(self) -> List[int]:
+        # 相比当前规则实际删除提前了多少秒（负数表示更晚）
+        return [r.deleted_at - r.removed_at for r in self.removals if r.deleted_at is not None]
+
+    def to_dict(self, limit: int = 100) -> Dict:
+        leads = self.lead_times
+        per_indexer: Dict[str, int] = {}
+        for removal in self.removals:
+            per_indexer[removal.indexer or ''] = per_indexer.get(removal.indexer or '', 0) + 1
+        return {
+            'downloads': self.downloads,
+            'samples': self.samples,
+            'would_remove': len(self.removals),
+            'completed_later': len(self.completed_later),
+            'actual_deletions': self.actual_deletions,
+            'matched_deletions': len(leads),
+            'median_lead_seconds': statistics.median(leads) if leads else None,
+            'per_indexer': per_indexer,
+            'seconds': round(self.seconds, 3),
+            'removals': [r._asdict() for r in self.removals[:limit]],
+        }
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _iter_chunks(connection: sqlite3.Connection, instance: Optional[str], since: int) \
+        -> Iterator[Tuple[Dict[int, Tuple], 'np.ndarray']]:
+    query = "SELECT id, download_id, title, indexer, size, added FROM downloads"
+    params: Tuple = ()
+    if instance:
+        query += " WHERE instance = ?"
+        params = (instance,)
+    query += " ORDER BY id"
+    downloads = connection.execute(query, params).fetchall()
+
+    # 按下载分块读取样本，每块包含完整的下载历史
+    for start in range(0, len(downloads), CHUNK_DOWNLOADS):
+        chunk = {row[0]: row[1:] for row in downloads[start:start + CHUNK_DOWNLOADS]}
+        marks = ','.join('?' * len(chunk))
+        rows = connection.execute(
+            f"SELECT download, ts, sizeleft, COALESCE(status, 0) FROM samples"
+            f" WHERE download IN ({marks}) AND ts >= ? ORDER BY download, ts",
+            (*chunk, since)
+        ).fetchall()
+        if rows:
+            yield chunk, np.array(rows, dtype=np.int64)
+
+
+def _ewma(ts, size_left, first, alpha: float):
+    # EWMA 依赖前一个值，只能顺序计算；转成列表逐项访问比 NumPy 标量快得多
+    ts = ts.tolist()
+    size_left = size_left.tolist()
+    result = []
+    ewma = None
+    for i, is_first in enumerate(first.tolist()):
+        if is_first:
+            ewma = None
+        elif ts[i] > ts[i - 1]:
+            speed = max(0.0, (size_left[i - 1] - size_left[i]) / (ts[i] - ts[i - 1]))
+            ewma = speed if ewma is None else alpha * speed + (1 - alpha) * ewma
+        result.append(NAN if ewma is None else ewma)
+    return np.array(result)
+
+
+def compute_columns(samples, meta: Dict[int, Tuple], status_codes: Dict[str, int], recent_window: float,
+                    history_size: int, ewma_alpha: float, need_ewma: bool) -> Dict:
+    download = samples[:, 0]
+    ts = samples[:, 1]
+    size_left = samples[:, 2]
+    count = len(samples)
+
+    ids = np.fromiter(meta, dtype=np.int64, count=len(meta))
+    sizes = np.fromiter((m[3] or 0 for m in meta.values()), dtype=np.int64, count=len(meta))
+    added_at = np.fromiter((m[4] or 0 for m in meta.values()), dtype=np.int64, count=len(meta))
+    row = np.searchsorted(ids, download)
+    size = sizes[row]
+    added = added_at[row]
+
+    index = np.arange(count)
+    first = np.ones(count, dtype=bool)
+    first[1:] = download[1:] != download[:-1]
+    group_start = np.maximum.accumulate(np.where(first, index, 0))
+
+    elapsed = (ts - added).astype(np.float64)
+    downloaded = (size - size_left).astype(np.float64)
+
+    average = np.zeros(count)
+    np.divide(downloaded, elapsed, out=average, where=elapsed > 0)
+
+    eta = np.full(count, float(NO_ETA))
+    np.divide(size_left, average, out=eta, where=average > 0)
+    eta /= 60
+
+    progress = np.zeros(count)
+    np.divide(downloaded, size, out=progress, where=size > 0)
+    progress *= 100
+
+    # 与 SpeedRing 一致：窗口内最早的样本，至少取上一条，最多回溯环形缓冲区容量
+    key = (download << 32) | ts
+    oldest = np.searchsorted(key, key - int(recent_window))
+    oldest = np.minimum(oldest, index - 1)
+    oldest = np.maximum(oldest, index - (max(2, history_size) - 1))
+    oldest = np.maximum(oldest, group_start)
+    span = (ts - ts[oldest]).astype(np.float64)
+    recent = np.full(count, np.nan)
+    np.divide((size_left[oldest] - size_left).astype(np.float64), span, out=recent, where=span > 0)
+    recent = np.where(np.isnan(recent), average, np.maximum(recent, 0.0))
+
+    if need_ewma:
+        ewma = _ewma(ts, size_left, first, ewma_alpha)
+        ewma = np.where(np.isnan(ewma), average, ewma)
+    else:
+        ewma = average
+
+    # 最近一次剩余大小减少的时间；复合键保证累计最大值不会跨越下载
+    moved = first.copy()
+    moved[1:] |= size_left[1:] < size_left[:-1]
+    last_progress = np.maximum.accumulate(np.where(moved, key, 0)) & 0xFFFFFFFF
+    stall = (ts - last_progress).astype(np.float64)
+
+    # 历史库中没有下载客户端数据，相关条件在回测中视为不满足
+    missing = np.full(count, np.nan)
+
+    return {
+        'elapsed_time': elapsed,
+        'average_speed': average,
+        'status': samples[:, 3],
+        'status_codes': status_codes,
+        'estimated_time': eta,
+        'percentage_downloaded': progress,
+        'recent_speed': recent,
+        'ewma_speed': ewma,
+        'stall_time': stall,
+        'client_speed': missing,
+        'client_seeds': missing,
+    }
+
+
+def backtest(
+        path: str,
+        compiled: CompiledRules,
+        instance: Optional[str] = None,
+        days: Optional[float] = None,
+        recent_window: float = 600,
+        history_size: int = 12,
+        ewma_alpha: float = 0.3,
+) -> BacktestReport:
+    if np is None:
+        raise RuntimeError("Backtesting requires NumPy")
+
+    started = time.perf_counter()
+    report = BacktestReport()
+    since = int(time.time() - days * 86400) if days else 0
+    need_ewma = any(check.field == 'ewma_speed' for check in compiled.checks)
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        status_codes = {name: id for id, name in connection.execute("SELECT id, name FROM statuses")}
+        completed_codes = [status_codes[s] for s in COMPLETED_STATUSES if s in status_codes]
+        deleted = dict(connection.execute(
+            "SELECT download, MIN(ts) FROM decisions"
+            " WHERE action IN ('delete', 'delete_skip') AND ts >= ? GROUP BY download",
+            (since,)
+        ).fetchall())
+
+        for meta, samples in _iter_chunks(connection, instance, since):
+            report.samples += len(samples)
+            download = samples[:, 0]
+            ts = samples[:, 1]
+            downloads = np.unique(download)
+            report.downloads += len(downloads)
+            report.actual_deletions += sum(1 for id in downloads.tolist() if id in deleted)
+
+            if not len(compiled):
+                # 没有条件时所有下载都会在首个样本被删除
+                hits = np.ones(len(samples), dtype=bool)
+            else:
+                columns = compute_columns(samples, meta, status_codes, recent_window, history_size, ewma_alpha,
+                                          need_ewma)
+                hits = evaluate_columns(compiled, columns) == 0
+            if not hits.any():
+                continue
+
+            # 每个下载第一次命中即视为删除时间
+            hit_index = np.flatnonzero(hits)
+            hit_downloads, first_hit = np.unique(download[hit_index], return_index=True)
+            removed_at = ts[hit_index[first_hit]]
+
+            done = (samples[:, 2] == 0) | np.isin(samples[:, 3], completed_codes)
+            done_index = np.flatnonzero(done)
+            done_downloads, first_done = np.unique(download[done_index], return_index=True)
+            completed = dict(zip(done_downloads.tolist(), ts[done_index[first_done]].tolist()))
+
+            for id, removed in zip(hit_downloads.tolist(), removed_at.tolist()):
+                download_id, title, indexer, size, added = meta[id]
+                report.removals.append(Removal(download_id, title or '', indexer or '', added or 0, removed,
+                                               completed.get(id), deleted.get(id)))
+    finally:
+        connection.close()
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _load_rules(value: str):
+    if value.startswith('@'):
+        with open(value[1:], 'r') as file:
+            return json.load(file)
+    return json.loads(value)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import utils.config
+
+    parser = argparse.ArgumentParser(prog='python -m utils.backtest',
+                                     description='Replay recorded queue history against a candidate rule set.')
+    parser.add_argument('--rules', help='Rules as JSON ([[enabled, {"C1": 60}], ...]) or @file; '
+                                        'defaults to the configured rules')
+    parser.add_argument('--db', help='History database path; defaults to history_db from the config')
+    parser.add_argument('--instance', help='Only replay downloads from this instance')
+    parser.add_argument('--days', type=float, help='Only replay the last N days')
+    parser.add_argument('--limit', type=int, default=20, help='Number of removals to list')
+    parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    args = parser.parse_args(argv)
+
+    utils.config.load_config()
+    config = utils.config.config
+    rules = _load_rules(args.rules) if args.rules else config.rules
+    report = backtest(args.db or config.history_db, compile_rules(rules), args.instance, args.days,
+                      config.recent_speed_window * 60, config.speed_history_size, config.ewma_alpha)
+
+    summary = report.to_dict(args.limit)
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return 0
+
+    print(f"Replayed {summary['samples']} samples of {summary['downloads']} downloads in {summary['seconds']}s")
+    print(f"Would remove: {summary['would_remove']} (completed later: {summary['completed_later']})")
+    print(f"Actually deleted: {summary['actual_deletions']}, also matched: {summary['matched_deletions']}, "
+          f"median lead: {summary['median_lead_seconds']}s")
+    for removal in report.removals[:args.limit]:
+        outcome = 'completed' if removal.completed_at is not None else 'unfinished'
+        print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(removal.removed_at))}  "
+              f"[{removal.indexer}] {removal.title} ({outcome})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+from typing import Dict, List, Tuple
+
+from utils.queue_cache import CachedRecord
+from utils.rules import MISS_LIMIT, NEAR_CLOSENESS, TIME_DRIVEN_FIELDS, CompiledRules, Metrics
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖，缺失时使用逐条计算
+    np = None
+
+NO_ETA = 99999999
+NAN = float('nan')
+
+
+def available() -> bool:
+    return np is not None
+
+
+def compute_metrics(entry: CachedRecord, timestamp: float, history, recent_window: float) -> Metrics:
+    item = entry.item
+    elapsed_time = timestamp - item.added
+
+    size = item.size
+    size_left = item.size_left
+    downloaded = size - size_left
+
+    # Calculate speeds
+    average_speed = downloaded / elapsed_time if elapsed_time > 0 else 0
+
+    # 历史样本不足时退回平均速度
+    ring = history.observe(item.id, timestamp, size_left)
+    recent_speed = ring.recent_speed(recent_window)
+    if recent_speed is None:
+        recent_speed = average_speed
+    ewma_speed = ring.ewma if ring.ewma is not None else average_speed
+    stall_time = ring.stall_time()
+
+    # Calculate estimated time
+    estimated_time = (size_left / average_speed if average_speed > 0 else NO_ETA) / 60
+
+    # Calculate percentage
+    percentage_downloaded = (downloaded / size) * 100 if size > 0 else 0
+
+    client = entry.client
+    client_speed = client.speed if client is not None else NAN
+    client_seeds = client.seeds if client is not None else NAN
+
+    return Metrics(elapsed_time, average_speed, item.status, estimated_time, percentage_downloaded,
+                   recent_speed, ewma_speed, stall_time, client_speed, client_seeds)
+
+
+def compute_columns(entries: List[CachedRecord], timestamp: float, history, recent_window: float) -> Dict:
+    count = len(entries)
+    items = [entry.item for entry in entries]
+    added = np.fromiter((item.added for item in items), dtype=np.float64, count=count)
+    size = np.fromiter((item.size for item in items), dtype=np.int64, count=count)
+    size_left = np.fromiter((item.size_left for item in items), dtype=np.int64, count=count)
+
+    # 状态字符串映射为整数编码，C2 用 isin 比较
+    status_codes: Dict[str, int] = {}
+    status = np.fromiter((status_codes.setdefault(item.status, len(status_codes)) for item in items),
+                         dtype=np.int32, count=count)
+
+    # 速度历史按记录保存在环形缓冲区中，只能逐条写入
+    recent = np.empty(count)
+    ewma = np.empty(count)
+    stall = np.empty(count)
+    for i, item in enumerate(items):
+        ring = history.observe(item.id, timestamp, item.size_left)
+        speed = ring.recent_speed(recent_window)
+        recent[i] = np.nan if speed is None else speed
+        ewma[i] = np.nan if ring.ewma is None else ring.ewma
+        stall[i] = ring.stall_time()
+
+    client_speed = np.fromiter((NAN if e.client is None else e.client.speed for e in entries),
+                               dtype=np.float64, count=count)
+    client_seeds = np.fromiter((NAN if e.client is None else e.client.seeds for e in entries),
+                               dtype=np.float64, count=count)
+
+    elapsed = timestamp - added
+    downloaded = size - size_left
+
+    average = np.zeros(count)
+    np.divide(downloaded, elapsed, out=average, where=elapsed > 0)
+
+    eta = np.full(count, float(NO_ETA))
+    np.divide(size_left, average, out=eta, where=average > 0)
+    eta /= 60
+
+    progress = np.zeros(count)
+    np.divide(downloaded, size, out=progress, where=size > 0)
+    progress *= 100
+
+    return {
+        'elapsed_time': elapsed,
+        'average_speed': average,
+        'status': status,
+        'status_codes': status_codes,
+        'estimated_time': eta,
+        'percentage_downloaded': progress,
+        'recent_speed': np.where(np.isnan(recent), average, recent),
+        'ewma_speed': np.where(np.isnan(ewma), average, ewma),
+        'stall_time': stall,
+        'client_speed': client_speed,
+        'client_seeds': client_seeds,
+    }
+
+
+def evaluate_columns(compiled: CompiledRules, columns: Dict):
+    # 每条记录不满足的条件数量，0 表示需要删除
+    failed = np.zeros(len(columns['elapsed_time']), dtype=np.int32)
+    for check in compiled.checks:
+        if check.threshold is None:
+            failed += 1
+        elif check.op == "in":
+            codes = [columns['status_codes'][s] for s in check.threshold if s in columns['status_codes']]
+            failed += ~np.isin(columns['status'], codes)
+        elif check.op == "gt":
+            failed += ~(columns[check.field] > check.threshold)
+        else:
+            failed += ~(columns[check.field] < check.threshold)
+    return np.minimum(failed, MISS_LIMIT)
+
+
+def near_columns(compiled: CompiledRules, columns: Dict, failed):
+    # 与 CompiledRules.near 一致：唯一未满足的条件随时间增长且已接近阈值
+    near = np.zeros(len(failed), dtype=bool)
+    single = failed == 1
+    for check in compiled.checks:
+        if check.field not in TIME_DRIVEN_FIELDS or check.op != "gt" or not check.threshold or check.threshold < 0:
+            continue
+        values = columns[check.field]
+        near |= single & ~(values > check.threshold) & (values >= check.threshold * NEAR_CLOSENESS)
+    return near
+
+
+def evaluate_batch(entries: List[CachedRecord], compiled: CompiledRules, timestamp: float, history,
+                   recent_window: float) -> Tuple[List[int], int]:
+    # 返回每条记录不满足的条件数量，以及接近触发的记录数量
+    columns = compute_columns(entries, timestamp, history, recent_window)
+    failed = evaluate_columns(compiled, columns)
+    return failed.tolist(), int(near_columns(compiled, columns, failed).sum())
@@ -0,0 +1,92 @@
+import time
+from typing import Dict, Optional
+
+from utils.log import Logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 用于 /metrics 的数值编码
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    # 连续失败达到阈值后断开，一段时间内直接拒绝请求；到期后只放行一个探测请求，
+    # 成功则恢复，失败则以加倍的等待时间再次断开
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30,
+                 max_reset_timeout: float = 600):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_timeout = reset_timeout
+        self.last_error: Optional[str] = None
+        self.changed_at = time.time()
+        self._probing = False
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger = Logger.get_logger()
+        message = f"Circuit breaker for {self.name}: {self.state} -> {state}"
+        if state == OPEN:
+            logger.warning(f"{message}, retrying in {self.open_timeout:.0f}s (last error: {self.last_error})")
+        else:
+            logger.info(message)
+        self.state = state
+        self.changed_at = time.time()
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # 半开状态下同一时间只允许一个探测请求
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def abort(self):
+        # 请求在得到结果前被取消，放弃这次探测
+        self._probing = False
+
+    def success(self):
+        self._probing = False
+        self.failures = 0
+        self.open_timeout = self.reset_timeout
+        self._transition(CLOSED)
+
+    def failure(self, error: str = None):
+        self._probing = False
+        self.failures += 1
+        self.last_error = error
+        if self.state == HALF_OPEN:
+            self.open_timeout = min(self.max_reset_timeout, self.open_timeout * 2)
+            self._open()
+        elif self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'failures': self.failures,
+            'retry_after': round(self.retry_after(), 1),
+            'last_error': self.last_error,
+            'changed_at': self.changed_at,
+        }
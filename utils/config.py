@@ -1,11 +1,17 @@
 import json
 import portalocker
 import os
-from dataclasses import dataclass
-from typing import List, Dict, Tuple, Optional
+import stat
+import tempfile
+import threading
+from dataclasses import dataclass, field, fields, replace
+from typing import Callable, List, Dict, NamedTuple, Tuple, Optional
 
+from utils.rules import CompiledRules, compile_rules
 
-@dataclass
+
+# 配置对象不可修改，变更时整体替换为新的快照
+@dataclass(frozen=True)
 class Config:
     apikey: str
     host: str
@@ -13,6 +19,49 @@ class Config:
     ssl: bool
     refresh_interval: int
     rules: Optional[List[Tuple[bool,Dict]]]
+    page_size: int = 250
+    fetch_concurrency: int = 4
+    stream_queue: bool = True  # 边接收边解析队列响应，只保留需要的字段
+    queue_probe: bool = True  # 先请求 v3/queue/status，队列为空时跳过完整拉取
+    include_unknown_items: bool = False  # 是否包含不属于任何系列的下载
+    connect_timeout: float = 10  # 秒
+    read_timeout: float = 30  # 秒，两次读取之间的最长等待
+    request_retries: int = 2  # 幂等请求失败后的重试次数
+    retry_base_delay: float = 0.5  # 秒
+    retry_max_delay: float = 10  # 秒
+    breaker_threshold: int = 5  # 连续失败多少次后熔断
+    breaker_reset_timeout: int = 30  # 秒，熔断后首次探测的等待时间，之后每次失败加倍
+    delete_batch_size: int = 50
+    delete_rate_limit: float = 5.0
+    delete_concurrency: int = 4
+    speed_history_size: int = 12
+    recent_speed_window: int = 10
+    ewma_alpha: float = 0.3
+    min_refresh_interval: int = 30  # 秒，队列变化或即将越过时间类阈值（C1、C8）时的轮询间隔
+    max_refresh_interval: int = 30  # 分钟，空闲或出错时退避的上限
+    event_mode: bool = False
+    signalr: bool = False
+    webhook_token: str = ""
+    reconcile_interval: int = 30  # 分钟，事件模式下的兜底全量检查间隔
+    download_clients: List[Dict] = field(default_factory=list)
+    url_base: str = ""
+    history_db: str = "config/history.db"  # 为空则不记录历史
+    history_retention_days: int = 30
+    history_downsample_hours: int = 24
+    event_log: str = ""  # 结构化事件日志路径，为空则不记录
+    event_log_format: str = "json"  # json 或 msgpack
+    dashboard: bool = True  # 在内存中保留每轮检查结果，供 /dashboard 展示
+    instances: List[Dict] = field(default_factory=list)
+    research_budget: int = 3  # 窗口内每个剧集最多触发重新搜索的次数，0 表示不限制
+    research_window_hours: int = 24
+    research_cooldown: int = 30  # 分钟，同一剧集两次重新搜索之间的最小间隔
+    research_exhausted_action: str = "skip"  # skip：删除但不重新搜索；defer：暂不删除
+    research_state_file: str = "config/research_budget.json"
+    web_server: str = "waitress"  # waitress 或 development
+    web_host: str = "0.0.0.0"
+    web_port: int = 5000
+    web_threads: int = 8
+    dashboard_streams: int = 4  # 同时保持的面板 SSE 连接上限，每个连接占用一个 Web 线程
 
     @classmethod
     def default(cls):
@@ -27,13 +76,38 @@ class Config:
         ])
 
 
+class ConfigSnapshot(NamedTuple):
+    version: int
+    config: Config
+    compiled_rules: CompiledRules
+    instances: Dict[str, Config]
+
+
 config: Config = Config.default()
 
 config_file_path = 'config/config.json'
 
+DEFAULT_INSTANCE = 'default'
+DEFAULT_PORTS = {'sonarr': 8989, 'radarr': 7878}
+_instance_cache: Tuple[Optional[Config], Dict[str, Config]] = (None, {})
+
+_listeners: List[Callable[[], None]] = []
+_publish_lock = threading.Lock()
+# version 为 0 表示尚未加载配置文件
+snapshot: ConfigSnapshot = ConfigSnapshot(0, config, compile_rules(config.rules), {DEFAULT_INSTANCE: config})
+
+
+def add_listener(callback: Callable[[], None]):
+    _listeners.append(callback)
+
 
-def load_config():
-    global config
+def remove_listener(callback: Callable[[], None]):
+    if callback in _listeners:
+        _listeners.remove(callback)
+
+
+def load_config(reload: bool = False) -> bool:
+    # 返回配置是否发生变化；热加载时文件无效则保留当前配置，避免编辑过程中退回默认值
     try:
         if not os.path.exists(config_file_path):
             raise FileNotFoundError(f"Configuration file '{config_file_path}' not found.")
@@ -42,48 +116,119 @@ def load_config():
             data = json.load(file)
 
         # 检查是否所有必需的字段都存在
-        config = Config(**data)
+        new_config = Config(**data)
 
     except FileNotFoundError as e:
         print(e)
-        config = Config.default()
+        if reload:
+            return False
+        new_config = Config.default()
 
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON: {e}")
-        config = Config.default()
+        if reload:
+            return False
+        new_config = Config.default()
 
     except TypeError as e:
         print(f"Error loading configuration: {e}")
-        config = Config.default()
+        if reload:
+            return False
+        new_config = Config.default()
+
+    return publish(new_config)
+
+
+def publish(new_config: Config) -> bool:
+    global config, snapshot
+    with _publish_lock:
+        previous = snapshot
+        if previous.version and new_config == previous.config:
+            return False
+
+        # 规则只在变化时重新编译
+        rules = previous.compiled_rules if new_config.rules == previous.config.rules else compile_rules(new_config.rules)
+        # 先构建完整快照再一次性替换，读取方不会看到新旧混合的配置
+        snapshot = ConfigSnapshot(previous.version + 1, new_config, rules, instance_configs(new_config))
+        config = new_config
+
+    for callback in list(_listeners):
+        callback()
+    return True
+
+
+def current() -> ConfigSnapshot:
+    return snapshot
+
+
+def instance_configs(base: Optional[Config] = None) -> Dict[str, Config]:
+    # 未配置 instances 时，顶层配置即为唯一实例；否则每个实例覆盖顶层配置中的同名字段
+    global _instance_cache
+    base = base or snapshot.config
+    cached_base, cached = _instance_cache
+    if cached_base is base:
+        return cached
+
+    if not base.instances:
+        result = {DEFAULT_INSTANCE: base}
+    else:
+        names = {f.name for f in fields(Config)} - {'instances'}
+        result = {}
+        for index, instance in enumerate(base.instances):
+            instance = dict(instance)
+            name = str(instance.pop('name', f"instance{index + 1}"))
+            app_type = str(instance.pop('type', 'sonarr')).lower()
+            # 顶层配置描述的是 Sonarr：同类型实例继承顶层端口，其他类型未设置端口时使用该类型的默认端口
+            if not instance.get('port') and (app_type != 'sonarr' or not base.port):
+                instance['port'] = DEFAULT_PORTS.get(app_type, base.port)
+            overrides = {key: value for key, value in instance.items() if key in names}
+            result[name] = replace(base, instances=[], **overrides)
+
+    _instance_cache = (base, result)
+    return result
+
+
+def instance_config(name: str) -> Optional[Config]:
+    return snapshot.instances.get(name)
+
+
+def file_mode(path: str) -> int:
+    # mkstemp 创建的文件权限为 0600，原子替换前改为原文件的权限；没有原文件时按 umask 计算
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 def update_config(new_config):
     try:
         #  检查文件夹是否存在，如果不存在则创建
-        config_dir = os.path.dirname(config_file_path)
+        config_dir = os.path.dirname(config_file_path) or '.'
         if not os.path.exists(config_dir):
             os.makedirs(config_dir)
-        
-        # 检查配置文件是否存在，如果不存在则创建
-        if not os.path.exists(config_file_path):
+
+        # 锁文件串行化多个写入方；先写临时文件再原子替换，读取方不会读到写了一半的文件
+        with open(config_file_path + '.lock', 'a') as lock:
+            portalocker.lock(lock, portalocker.LOCK_EX)  # 加锁
             try:
-                with open(config_file_path, 'w') as f:
-                    json.dump({}, f)
-            except IOError as e:
-                print(f"Error creating config file: {e}")
-
-        with open(config_file_path, 'r+') as f:
-            portalocker.lock(f, portalocker.LOCK_EX)  # 加锁
-
-            # 重置文件指针并写入新的配置
-            f.seek(0)
-            json.dump(new_config, f, indent=4)
-            f.truncate()  # 清除多余的内容
-            portalocker.unlock(f)  # 解锁
-
-    except json.JSONDecodeError:
-        print("Error: The file is not a valid JSON.")
+                fd, temp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=config_dir)
+                try:
+                    os.fchmod(fd, file_mode(config_file_path))
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(new_config, f, indent=4)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_path, config_file_path)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+            finally:
+                portalocker.unlock(lock)  # 解锁
+
     except Exception as e:
         print(f"An error occurred: {e}")
 
-    load_config()
+    load_config(reload=True)
@@ -0,0 +1,84 @@
+import os
+import threading
+from typing import Callable, Optional, Tuple
+
+from utils.log import Logger
+
+try:
+    import inotify_simple
+except ImportError:  # inotify_simple 是可选依赖，缺失时轮询文件的修改时间
+    inotify_simple = None
+
+POLL_INTERVAL = 2.0
+# 编辑器保存时可能连续触发多个事件，等待片刻再加载
+DEBOUNCE = 0.5
+
+
+class ConfigWatcher:
+    def __init__(self, path: str, on_change: Callable[[], object], poll_interval: float = POLL_INTERVAL):
+        self.path = path
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last: Optional[Tuple[int, int, int]] = None
+
+    def start(self):
+        # 在调用线程中记录初始状态，启动之后的任何修改都不会被漏掉
+        self._last = self._stat()
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        logger = Logger.get_logger()
+        if inotify_simple is not None:
+            try:
+                self._watch_inotify()
+                return
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({str(e)}), polling config file instead")
+        self._watch_polling()
+
+    def _changed(self):
+        logger = Logger.get_logger()
+        try:
+            if self.on_change():
+                logger.info(f"Reloaded configuration from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to reload configuration: {str(e)}")
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        # 原子替换会改变 inode，原地修改会改变修改时间或大小
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _watch_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            current = self._stat()
+            if current != self._last and current is not None:
+                self._stop.wait(DEBOUNCE)
+                self._last = self._stat()
+                self._changed()
+
+    def _watch_inotify(self):
+        # 监听所在目录，这样临时文件改名覆盖也能收到事件
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name = os.path.basename(self.path)
+        flags = inotify_simple.flags
+        with inotify_simple.INotify() as inotify:
+            inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+            while not self._stop.is_set():
+                events = inotify.read(timeout=int(self.poll_interval * 1000))
+                if any(event.name == name for event in events):
+                    # 合并短时间内的连续事件
+                    inotify.read(timeout=int(DEBOUNCE * 1000))
+                    self._changed()
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 保留的增量数量；客户端落后更多时改发完整快照
+DIFF_HISTORY = 120
+RECENT_DELETIONS = 50
+HEARTBEAT_INTERVAL = 15
+# 最后一次读取之后继续发布的时长（秒）；没有读取方时监控循环不计算面板数据
+READER_IDLE = 300
+# 单个 SSE 连接的最长时长（秒），到期后浏览器带上 Last-Event-ID 自动重连，释放 Web 线程
+STREAM_LIFETIME = 300
+# SSE 连接数已满时让浏览器等待多久再重连（毫秒）
+STREAM_RETRY = 30000
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class InstanceView:
+    # 单个实例最近一次检查的结果，每条记录只在变化时序列化一次
+    def __init__(self, name: str):
+        self.name = name
+        self.version = 0
+        self.items: Dict[int, str] = {}
+        self.deletions: deque = deque(maxlen=RECENT_DELETIONS)
+        self.diffs: deque = deque(maxlen=DIFF_HISTORY)
+        self.updated_at = 0.0
+        self._snapshot: Optional[Tuple[int, str]] = None
+
+    def apply(self, rows: Dict[int, Dict], deletions: List[Dict], timestamp: float) -> Optional[str]:
+        upsert = []
+        items = {}
+        for id, row in rows.items():
+            encoded = self.items.get(id)
+            fresh = _dumps(row)
+            if encoded != fresh:
+                upsert.append(fresh)
+            items[id] = fresh
+        removed = [id for id in self.items if id not in items]
+        self.items = items
+        self.updated_at = timestamp
+        self.deletions.extend(deletions)
+
+        if not upsert and not removed and not deletions:
+            return None
+
+        self.version += 1
+        diff = (f'{{"instance":{_dumps(self.name)},"version":{self.version},"ts":{timestamp},'
+                f'"upsert":[{",".join(upsert)}],"remove":{_dumps(removed)},"deleted":{_dumps(deletions)}}}')
+        self.diffs.append((self.version, diff))
+        return diff
+
+    def snapshot(self) -> str:
+        # 完整快照按版本缓存，同一版本只拼接一次
+        cached = self._snapshot
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        payload = (f'{{"instance":{_dumps(self.name)},"version":{self.version},"ts":{self.updated_at},'
+                   f'"items":[{",".join(self.items.values())}],"deleted":{_dumps(list(self.deletions))}}}')
+        self._snapshot = (self.version, payload)
+        return payload
+
+    def diffs_since(self, version: int) -> Optional[List[Tuple[int, str]]]:
+        if version == self.version:
+            return []
+        # 版本号来自已被替换的视图（例如实例重启）时同样改发快照
+        if version > self.version or not self.diffs or self.diffs[0][0] > version + 1:
+            return None
+        return [(diff_version, diff) for diff_version, diff in self.diffs if diff_version > version]
+
+
+class DashboardStore:
+    # 事件循环线程写入，Web 线程读取；写入后通知所有等待中的 SSE 连接
+    def __init__(self):
+        self.views: Dict[str, InstanceView] = {}
+        self._condition = threading.Condition()
+        self._streams: Dict[str, int] = {}
+        self._read_at: Dict[str, float] = {}
+
+    def publish(self, instance: str, rows: Dict[int, Dict], deletions: List[Dict], timestamp: float = None):
+        with self._condition:
+            view = self.views.get(instance)
+            if view is None:
+                view = self.views[instance] = InstanceView(instance)
+            if view.apply(rows, deletions, timestamp or time.time()) is not None:
+                self._condition.notify_all()
+
+    def remove(self, instance: str):
+        with self._condition:
+            self.views.pop(instance, None)
+
+    def snapshot(self, instance: str) -> Optional[str]:
+        with self._condition:
+            view = self.views.get(instance)
+            return view.snapshot() if view is not None else None
+
+    def instances(self) -> List[str]:
+        with self._condition:
+            return list(self.views)
+
+    def _wanted(self, instance: str) -> bool:
+        return (self._streams.get(instance, 0) > 0
+                or time.monotonic() - self._read_at.get(instance, float('-inf')) < READER_IDLE)
+
+    def wanted(self, instance: str) -> bool:
+        # 有 SSE 连接或最近有人读取过时才需要发布
+        with self._condition:
+            return self._wanted(instance)
+
+    def touch(self, instance: str) -> bool:
+        # 记录一次读取；返回此前是否无人读取，调用方可据此立即触发一轮检查
+        with self._condition:
+            idle = not self._wanted(instance)
+            self._read_at[instance] = time.monotonic()
+        return idle
+
+    def stream(self, instance: str, version: Optional[int] = None, heartbeat: float = HEARTBEAT_INTERVAL,
+               lifetime: float = STREAM_LIFETIME, max_streams: Optional[int] = None) -> Iterator[str]:
+        # 先发送完整快照（断线重连时从 version 之后继续），之后只推送增量；落后太多时重新发送快照
+        with self._condition:
+            full = max_streams is not None and sum(self._streams.values()) >= max_streams
+            if not full:
+                self._streams[instance] = self._streams.get(instance, 0) + 1
+        if full:
+            yield f'retry: {STREAM_RETRY}\n\n'
+            return
+
+        try:
+            deadline = time.monotonic() + lifetime
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                with self._condition:
+                    view = self.views.get(instance)
+                    if view is None:
+                        messages, event = [], None
+                    elif version is None:
+                        messages, event = [(view.version, view.snapshot())], 'snapshot'
+                    else:
+                        messages = view.diffs_since(version)
+                        event = 'diff'
+                        if messages is None:
+                            messages, event = [(view.version, view.snapshot())], 'snapshot'
+                    if view is not None:
+                        version = view.version
+                    woken = self._condition.wait(min(heartbeat, remaining)) if not messages else True
+
+                if not messages:
+                    if not woken:
+                        yield ': keepalive\n\n'
+                    continue
+                for message_version, message in messages:
+                    yield f'event: {event}\nid: {message_version}\ndata: {message}\n\n'
+        finally:
+            with self._condition:
+                self._streams[instance] -= 1
+                if not self._streams[instance]:
+                    del self._streams[instance]
+                # 断开后仍保持一段时间的发布，重连时不必等待下一轮检查
+                self._read_at[instance] = time.monotonic()
+
+
+store = DashboardStore()
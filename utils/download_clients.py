@@ -0,0 +1,191 @@
+import asyncio
+from typing import Dict, List, NamedTuple, Optional
+
+import aiohttp
+
+from utils.log import Logger
+
+
+# 下载器无法提供的数据，规则比较时永远不成立
+NAN = float('nan')
+
+
+class ClientStats(NamedTuple):
+    speed: float  # 字节/秒
+    seeds: float
+    peers: float
+    state: str
+
+
+class DownloadClient:
+    default_port = 0
+
+    def __init__(
+            self,
+            session: aiohttp.ClientSession,
+            host: str,
+            port: Optional[int] = None,
+            username: str = '',
+            password: str = '',
+            apikey: str = '',
+            url_base: str = '',
+            ssl: bool = False,
+    ):
+        self.session = session
+        self.username = username
+        self.password = password
+        self.apikey = apikey
+        self.ssl = ssl
+
+        host = host.replace('http://', '').replace('https://', '')
+        url_base = url_base.strip('/')
+        self.base_url = f"http{'s' if ssl else ''}://{host}:{port or self.default_port}/" + (url_base + '/' if url_base else '')
+
+    async def fetch(self) -> Dict[str, ClientStats]:
+        raise NotImplementedError
+
+
+class QBittorrentClient(DownloadClient):
+    default_port = 8080
+
+    async def _login(self):
+        async with self.session.post(self.base_url + 'api/v2/auth/login', ssl=self.ssl,
+                                     data={'username': self.username, 'password': self.password}) as response:
+            if response.status != 200 or (await response.text()).strip() != 'Ok.':
+                raise ValueError('qBittorrent login failed')
+
+    async def fetch(self) -> Dict[str, ClientStats]:
+        for attempt in range(2):
+            async with self.session.get(self.base_url + 'api/v2/torrents/info', ssl=self.ssl) as response:
+                if response.status == 403 and attempt == 0:
+                    await self._login()
+                    continue
+                response.raise_for_status()
+                torrents = await response.json()
+
+            return {
+                torrent['hash'].upper(): ClientStats(torrent.get('dlspeed', 0), torrent.get('num_seeds', 0),
+                                                     torrent.get('num_leechs', 0), torrent.get('state', ''))
+                for torrent in torrents
+            }
+        return {}
+
+
+class TransmissionClient(DownloadClient):
+    default_port = 9091
+    # Transmission 的状态编码
+    STATES = {0: 'stopped', 1: 'check_wait', 2: 'checking', 3: 'download_wait', 4: 'downloading',
+              5: 'seed_wait', 6: 'seeding'}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_id = ''
+        if not self.base_url.rstrip('/').endswith('transmission'):
+            self.base_url += 'transmission/'
+
+    async def fetch(self) -> Dict[str, ClientStats]:
+        payload = {
+            'method': 'torrent-get',
+            'arguments': {'fields': ['hashString', 'rateDownload', 'peersSendingToUs', 'peersConnected', 'status']}
+        }
+        auth = aiohttp.BasicAuth(self.username, self.password) if self.username else None
+
+        for attempt in range(2):
+            headers = {'X-Transmission-Session-Id': self.session_id}
+            async with self.session.post(self.base_url + 'rpc', json=payload, headers=headers, auth=auth,
+                                         ssl=self.ssl) as response:
+                if response.status == 409 and attempt == 0:
+                    # 首次请求需要换取会话 ID
+                    self.session_id = response.headers.get('X-Transmission-Session-Id', '')
+                    continue
+                response.raise_for_status()
+                data = await response.json()
+
+            return {
+                torrent['hashString'].upper(): ClientStats(torrent.get('rateDownload', 0),
+                                                           torrent.get('peersSendingToUs', 0),
+                                                           torrent.get('peersConnected', 0),
+                                                           self.STATES.get(torrent.get('status'), 'unknown'))
+                for torrent in data.get('arguments', {}).get('torrents', [])
+            }
+        return {}
+
+
+class SabnzbdClient(DownloadClient):
+    default_port = 8080
+
+    async def fetch(self) -> Dict[str, ClientStats]:
+        params = {'mode': 'queue', 'output': 'json', 'apikey': self.apikey}
+        async with self.session.get(self.base_url + 'api', params=params, ssl=self.ssl) as response:
+            response.raise_for_status()
+            queue = (await response.json(content_type=None)).get('queue', {})
+
+        # SABnzbd 只提供整体速度，按顺序逐个下载，因此只记在正在下载的任务上；
+        # 排队中的任务没有速度，Usenet 也没有做种数，均记为 NaN，避免 C9/C10 命中排队的任务
+        speed = float(queue.get('kbpersec') or 0) * 1024
+        return {
+            slot['nzo_id'].upper(): ClientStats(speed if slot.get('status') == 'Downloading' else NAN, NAN, NAN,
+                                                slot.get('status', ''))
+            for slot in queue.get('slots', [])
+        }
+
+
+CLIENT_TYPES = {
+    'qbittorrent': QBittorrentClient,
+    'transmission': TransmissionClient,
+    'sabnzbd': SabnzbdClient,
+}
+
+
+class DownloadClients:
+    def __init__(self, settings: List[Dict], connection_limit: int = 10, connect_timeout: float = 10,
+                 timeout: float = 30):
+        self.settings = settings
+        self.connection_limit = connection_limit
+        # 下载器数据在拉取队列之前获取，限制总耗时，避免一个无响应的下载器拖住整轮检查
+        self.timeouts = (connect_timeout, timeout)
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.clients: List[DownloadClient] = []
+
+    def _build(self):
+        logger = Logger.get_logger()
+        # 所有下载器共用一个连接池；下载器常用 IP 访问，需要允许 IP 主机的 Cookie
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                                              cookie_jar=aiohttp.CookieJar(unsafe=True), timeout=self.timeout)
+        self.clients = []
+        for setting in self.settings:
+            setting = dict(setting)
+            client_type = CLIENT_TYPES.get(str(setting.pop('type', '')).lower())
+            if client_type is None:
+                logger.warning(f"Unknown download client type in config: {setting}")
+                continue
+            try:
+                self.clients.append(client_type(self._session, **setting))
+            except (TypeError, ValueError) as e:
+                # 单个下载器配置有误时跳过，其余下载器照常使用
+                logger.error(f"Invalid {client_type.__name__} settings {setting}: {str(e)}")
+
+    async def fetch_all(self) -> Dict[str, ClientStats]:
+        logger = Logger.get_logger()
+        if not self.settings:
+            return {}
+        if self._session is None or self._session.closed:
+            self._build()
+
+        results = await asyncio.gather(*(client.fetch() for client in self.clients), return_exceptions=True)
+        stats: Dict[str, ClientStats] = {}
+        for client, result in zip(self.clients, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to fetch stats from {type(client).__name__} at {client.base_url}: "
+                               f"{str(result) or type(result).__name__}")
+                continue
+            stats.update(result)
+
+        logger.debug(f"Fetched live stats for {len(stats)} downloads from {len(self.clients)} clients")
+        return stats
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+from typing import Dict, Iterator, List, Optional
+
+from utils.log import Logger
+from utils.queue_item import QueueItem
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可选依赖，缺失时退回 JSON Lines
+    msgpack = None
+
+# 与文本日志的轮转设置一致
+MAX_BYTES = 1024 * 1024 * 10
+BACKUP_COUNT = 7
+QUEUE_LIMIT = 10000
+
+
+class EventLog:
+    def __init__(
+            self,
+            path: str,
+            format: str = 'json',
+            max_bytes: int = MAX_BYTES,
+            backup_count: int = BACKUP_COUNT,
+            batch_size: int = 500,
+            flush_interval: float = 2.0,
+    ):
+        if format == 'msgpack' and msgpack is None:
+            Logger.get_logger().warning("msgpack is not installed, writing the event log as JSON lines")
+            format = 'json'
+        self.path = path
+        self.format = format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_LIMIT)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 10):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _put(self, event: Dict):
+        # 从事件循环调用，不能阻塞；写入跟不上时丢弃并记录
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            Logger.get_logger().warning("Event log writer is falling behind, dropping events")
+
+    def decision(self, instance: str, timestamp: float, item: QueueItem, metrics: Dict, rule: str, action: str):
+        self._put({
+            'type': 'decision',
+            'ts': timestamp,
+            'instance': instance,
+            'queue_id': item.id,
+            'download_id': item.download_id,
+            'title': item.title,
+            'indexer': item.indexer,
+            'status': item.status,
+            'metrics': metrics,
+            'rule': rule,
+            'action': action,
+        })
+
+    def cycle(self, instance: str, timestamp: float, duration: float, summary=None, error: str = None):
+        event = {
+            'type': 'cycle',
+            'ts': timestamp,
+            'instance': instance,
+            'duration': round(duration, 4),
+        }
+        if summary is not None:
+            event.update(evaluated=summary.evaluated, added=summary.added, updated=summary.updated,
+                         removed=summary.removed, near=summary.near,
+                         deleted=sum(1 for success in summary.deleted.values() if success),
+                         failed=sum(1 for success in summary.deleted.values() if not success))
+        if error is not None:
+            event['error'] = error
+        self._put(event)
+
+    def _encode(self, events: List[Dict]) -> bytes:
+        if self.format == 'msgpack':
+            return b''.join(msgpack.packb(event, use_bin_type=True) for event in events)
+        return ''.join(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n'
+                       for event in events).encode('utf-8')
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, data: bytes):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'ab') as file:
+            file.write(data)
+
+    def _run(self):
+        logger = Logger.get_logger()
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if None in batch:
+                stopping = True
+                batch = [event for event in batch if event is not None]
+
+            if batch:
+                try:
+                    self._write(self._encode(batch))
+                except (OSError, TypeError, ValueError) as e:
+                    logger.error(f"Failed to write event log batch: {str(e)}")
+
+
+def log_files(path: str) -> List[str]:
+    # 轮转文件从旧到新排列
+    rotated = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        rotated.append(f"{path}.{index}")
+        index += 1
+    files = list(reversed(rotated))
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_events(path: str, rotated: bool = True) -> Iterator[Dict]:
+    # 逐条流式解析，不会一次读入整个文件
+    for file_path in (log_files(path) if rotated else [path]):
+        with open(file_path, 'rb') as file:
+            head = file.peek(1)[:1] if hasattr(file, 'peek') else b''
+            if head and head != b'{' and msgpack is not None:
+                yield from msgpack.Unpacker(file, raw=False)
+                continue
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+event_log: Optional[EventLog] = None
+
+
+def open_log(path: str, format: str = 'json') -> Optional[EventLog]:
+    global event_log
+    if not path:
+        return None
+    event_log = EventLog(path, format)
+    event_log.start()
+    return event_log
+
+
+def close_log():
+    global event_log
+    if event_log is not None:
+        event_log.close()
+    event_log = None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m utils.event_log',
+                                     description='Stream events from a structured event log as JSON lines.')
+    parser.add_argument('path')
+    parser.add_argument('--type', choices=['decision', 'cycle'])
+    parser.add_argument('--instance')
+    args = parser.parse_args(argv)
+
+    for event in iter_events(args.path):
+        if args.type and event.get('type') != args.type:
+            continue
+        if args.instance and event.get('instance') != args.instance:
+            continue
+        print(json.dumps(event, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+from threading import Lock
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+
+class Subscription:
+    def __init__(self, name: str, wake: Callable[[], None]):
+        self.name = name
+        self.wake = wake
+        self.pending = False
+        self.download_ids: Set[str] = set()
+
+
+class EventInbox:
+    # webhook 在 Flask 线程写入，各实例的监控循环在事件循环线程读取
+    def __init__(self):
+        self._lock = Lock()
+        self._subscriptions: List[Subscription] = []
+
+    def subscribe(self, name: str, wake: Callable[[], None]) -> Subscription:
+        subscription = Subscription(name, wake)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def mark(self, download_ids: Iterable[str] = (), instance: Optional[str] = None):
+        # instance 为空时通知所有实例
+        download_ids = {id.upper() for id in download_ids if id}
+        with self._lock:
+            targets = [s for s in self._subscriptions if instance is None or s.name == instance]
+            for subscription in targets:
+                subscription.download_ids.update(download_ids)
+                subscription.pending = True
+
+        for subscription in targets:
+            subscription.wake()
+
+    def drain(self, subscription: Subscription) -> Tuple[bool, Set[str]]:
+        with self._lock:
+            pending, download_ids = subscription.pending, subscription.download_ids
+            subscription.pending = False
+            subscription.download_ids = set()
+        return pending, download_ids
+
+
+inbox = EventInbox()
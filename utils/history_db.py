@@ -0,0 +1,276 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.log import Logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    instance TEXT NOT NULL,
+    download_id TEXT NOT NULL,
+    title TEXT,
+    indexer TEXT,
+    size INTEGER,
+    added INTEGER,
+    first_seen INTEGER,
+    last_seen INTEGER,
+    last_sizeleft INTEGER,
+    UNIQUE (instance, download_id)
+);
+CREATE TABLE IF NOT EXISTS statuses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    download INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    sizeleft INTEGER NOT NULL,
+    status INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_download_ts ON samples (download, ts);
+CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts);
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY,
+    download INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    indexer TEXT,
+    action TEXT NOT NULL,
+    rule TEXT,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS decisions_download_ts ON decisions (download, ts);
+CREATE INDEX IF NOT EXISTS decisions_indexer_ts ON decisions (indexer, ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+MAINTENANCE_INTERVAL = 3600
+QUEUE_LIMIT = 1000
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class HistoryStore:
+    def __init__(
+            self,
+            path: str = 'config/history.db',
+            retention_days: int = 30,
+            downsample_hours: int = 24,
+            downsample_bucket: int = 600,
+            batch_size: int = 1000,
+            flush_interval: float = 2.0,
+    ):
+        self.path = path
+        self.retention_days = retention_days
+        self.downsample_hours = downsample_hours
+        # 降采样后同一下载每个时间桶（秒）只保留一条样本
+        self.downsample_bucket = downsample_bucket
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_LIMIT)
+        self._thread: Optional[threading.Thread] = None
+        self._download_ids: Dict[Tuple[str, str], int] = {}
+        self._status_ids: Dict[str, int] = {}
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 10):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _put(self, item):
+        # 从事件循环调用，不能阻塞；写入跟不上时丢弃并记录
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            Logger.get_logger().warning("History writer is falling behind, dropping records")
+
+    def record_samples(self, instance: str, timestamp: float, rows: List[Tuple]):
+        # rows: (download_id, title, indexer, size, added, sizeleft, status)
+        if rows:
+            self._put(('samples', instance, int(timestamp), rows))
+
+    def record_decision(self, instance: str, timestamp: float, download: Tuple, action: str, rule: str,
+                        metrics: Dict):
+        # download: (download_id, title, indexer, size, added, sizeleft, status)
+        self._put(('decision', instance, int(timestamp), download, action, rule, json.dumps(metrics)))
+
+    def _run(self):
+        logger = Logger.get_logger()
+        connection = connect(self.path)
+        last_maintenance = 0.0
+        stopping = False
+        try:
+            while not stopping:
+                batch = []
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                    while len(batch) < self.batch_size:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                if None in batch:
+                    stopping = True
+                    batch = [item for item in batch if item is not None]
+
+                if batch:
+                    try:
+                        with connection:
+                            for item in batch:
+                                self._write(connection, item)
+                    except sqlite3.Error as e:
+                        logger.error(f"Failed to write history batch: {str(e)}")
+
+                if time.time() - last_maintenance > MAINTENANCE_INTERVAL:
+                    last_maintenance = time.time()
+                    try:
+                        self.maintain(connection)
+                    except sqlite3.Error as e:
+                        logger.error(f"History maintenance failed: {str(e)}")
+        finally:
+            connection.close()
+
+    def _download_key(self, connection, instance: str, timestamp: int, row: Tuple) -> int:
+        download_id, title, indexer, size, added, size_left, _ = row
+        key = (instance, download_id)
+        id = self._download_ids.get(key)
+        if id is None:
+            id = connection.execute(
+                "INSERT INTO downloads (instance, download_id, title, indexer, size, added, first_seen, last_seen,"
+                " last_sizeleft) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (instance, download_id) DO UPDATE SET last_seen = excluded.last_seen"
+                " RETURNING id",
+                (instance, download_id, title, indexer, size, added, timestamp, timestamp, size_left)
+            ).fetchone()[0]
+            self._download_ids[key] = id
+        return id
+
+    def _status_key(self, connection, status: str) -> int:
+        id = self._status_ids.get(status)
+        if id is None:
+            connection.execute("INSERT OR IGNORE INTO statuses (name) VALUES (?)", (status,))
+            id = connection.execute("SELECT id FROM statuses WHERE name = ?", (status,)).fetchone()[0]
+            self._status_ids[status] = id
+        return id
+
+    def _write(self, connection, item):
+        kind, instance, timestamp = item[0], item[1], item[2]
+        if kind == 'samples':
+            rows = item[3]
+            keys = [self._download_key(connection, instance, timestamp, row) for row in rows]
+            connection.executemany(
+                "INSERT INTO samples (download, ts, sizeleft, status) VALUES (?, ?, ?, ?)",
+                [(key, timestamp, row[5], self._status_key(connection, row[6])) for key, row in zip(keys, rows)]
+            )
+            connection.executemany(
+                "UPDATE downloads SET last_seen = ?, last_sizeleft = ? WHERE id = ?",
+                [(timestamp, row[5], key) for key, row in zip(keys, rows)]
+            )
+        else:
+            _, _, _, download, action, rule, metrics = item
+            key = self._download_key(connection, instance, timestamp, download)
+            connection.execute(
+                "INSERT INTO decisions (download, ts, indexer, action, rule, metrics) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, timestamp, download[2], action, rule, metrics)
+            )
+
+    def maintain(self, connection):
+        logger = Logger.get_logger()
+        now = int(time.time())
+        retention_cutoff = now - self.retention_days * 86400
+        downsample_cutoff = now - self.downsample_hours * 3600
+
+        row = connection.execute("SELECT value FROM meta WHERE key = 'downsampled_until'").fetchone()
+        downsampled_until = int(row[0]) if row else 0
+
+        with connection:
+            removed = connection.execute("DELETE FROM samples WHERE ts < ?", (retention_cutoff,)).rowcount
+            connection.execute("DELETE FROM decisions WHERE ts < ?", (retention_cutoff,))
+            connection.execute(
+                "DELETE FROM downloads WHERE last_seen < ?"
+                " AND id NOT IN (SELECT download FROM decisions)", (retention_cutoff,)
+            )
+
+            # 只处理上次降采样之后新变旧的区间
+            start = max(downsampled_until, retention_cutoff)
+            if downsample_cutoff > start:
+                removed += connection.execute(
+                    "DELETE FROM samples WHERE ts >= ? AND ts < ? AND rowid NOT IN ("
+                    " SELECT MIN(rowid) FROM samples WHERE ts >= ? AND ts < ?"
+                    " GROUP BY download, ts / ?)",
+                    (start, downsample_cutoff, start, downsample_cutoff, self.downsample_bucket)
+                ).rowcount
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('downsampled_until', ?)",
+                                   (str(downsample_cutoff),))
+
+        self._download_ids.clear()
+        logger.info(f"History maintenance removed {removed} samples")
+
+
+def download_history(path: str, instance: str, download_id: str) -> List[Tuple]:
+    connection = connect(path)
+    try:
+        return connection.execute(
+            "SELECT s.ts, s.sizeleft, st.name FROM samples s"
+            " JOIN downloads d ON d.id = s.download"
+            " LEFT JOIN statuses st ON st.id = s.status"
+            " WHERE d.instance = ? AND d.download_id = ? ORDER BY s.ts",
+            (instance, download_id)
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+def deletions_per_indexer(path: str, days: int = 7) -> List[Tuple]:
+    connection = connect(path)
+    try:
+        return connection.execute(
+            "SELECT indexer, date(ts, 'unixepoch') AS day, COUNT(*) FROM decisions"
+            " WHERE action IN ('delete', 'delete_skip') AND ts >= ? GROUP BY indexer, day ORDER BY day, indexer",
+            (int(time.time()) - days * 86400,)
+        ).fetchall()
+    finally:
+        connection.close()
+
+
+store: Optional[HistoryStore] = None
+
+
+def open_store(path: str, retention_days: int = 30, downsample_hours: int = 24) -> Optional[HistoryStore]:
+    global store
+    if not path:
+        return None
+    store = HistoryStore(path, retention_days, downsample_hours)
+    store.start()
+    return store
+
+
+def close_store():
+    global store
+    if store is not None:
+        store.close()
+    store = None
@@ -0,0 +1,93 @@
+import codecs
+import json
+import re
+from typing import AsyncIterable, AsyncIterator, Dict, Optional
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+_NUMBER_TAIL = frozenset('0123456789.eE+-')
+
+
+class _Reader:
+    # 在分块到达的文本上逐个解析 JSON 值，只保留尚未解析的部分
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self.chunks = chunks.__aiter__()
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            chunk = b''
+        # 只在读入新数据时丢弃已解析的部分，避免每条记录都复制缓冲区
+        self.text = self.text[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    async def peek(self) -> str:
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                raise ValueError('Unexpected end of JSON input')
+
+    async def expect(self, chars: str) -> str:
+        char = await self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} but found {char!r} in JSON input")
+        self.pos += 1
+        return char
+
+    async def value(self):
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # 值被截断在块边界上，读入下一块后重新解析
+                if not await self.fill():
+                    raise
+                continue
+            # 数字可能在块边界处被截断（如 "1." 会先解析为 1），看不到后续字符时先读入下一块
+            if (end == len(self.text) or self.text[end] in _NUMBER_TAIL) and await self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+async def iter_array(chunks: AsyncIterable[bytes], key: str = 'records',
+                     envelope: Optional[Dict] = None) -> AsyncIterator:
+    # 逐个产出顶层对象中 key 数组的元素；其余顶层字段写入 envelope，数组本身以元素个数记录
+    reader = _Reader(chunks)
+    await reader.expect('{')
+    if await reader.peek() == '}':
+        return
+    while True:
+        name = await reader.value()
+        await reader.expect(':')
+        if name == key and await reader.peek() == '[':
+            reader.pos += 1
+            count = 0
+            if await reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield await reader.value()
+                    count += 1
+                    if await reader.expect(',]') == ']':
+                        break
+            if envelope is not None:
+                envelope[name] = count
+        else:
+            value = await reader.value()
+            if envelope is not None:
+                envelope[name] = value
+        if await reader.expect(',}') == '}':
+            return
@@ -1,13 +1,22 @@
+import atexit
 import os
 import logging
-from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
-from typing import Optional, Union, Literal, Dict
+import queue
+from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler, QueueHandler, QueueListener
+from typing import Optional, Union, Literal, Dict, List
 from threading import Lock
 
 
+class _DeferredQueueHandler(QueueHandler):
+    # 同进程内的队列无需序列化，记录原样入队，消息格式化也交给后台线程
+    def prepare(self, record):
+        return record
+
+
 class Logger:
     _instance: Dict[str, 'Logger'] = {}
     _lock = Lock()
+    _listeners: List[QueueListener] = []
 
     def __init__(
             self,
@@ -22,7 +31,8 @@ class Logger:
             max_bytes: int = 1024 * 1024 * 10,  # 10MB
             encoding: str = "utf-8",
             console_output: bool = True,
-            format_string: Optional[str] = None
+            format_string: Optional[str] = None,
+            queue_mode: bool = False
     ):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(level)
@@ -54,12 +64,23 @@ class Logger:
                 )
 
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            handlers = [file_handler]
 
             if console_output:
                 console_handler = logging.StreamHandler()
                 console_handler.setFormatter(formatter)
-                self.logger.addHandler(console_handler)
+                handlers.append(console_handler)
+
+            if queue_mode:
+                # 调用方只把记录放入队列，格式化与磁盘/控制台写入由后台线程完成
+                log_queue = queue.SimpleQueue()
+                listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+                listener.start()
+                Logger._listeners.append(listener)
+                self.logger.addHandler(_DeferredQueueHandler(log_queue))
+            else:
+                for handler in handlers:
+                    self.logger.addHandler(handler)
 
     @classmethod
     def get_logger(
@@ -75,8 +96,13 @@ class Logger:
             max_bytes: int = 1024 * 1024 * 10,
             encoding: str = "utf-8",
             console_output: bool = True,
-            format_string: Optional[str] = None
+            format_string: Optional[str] = None,
+            queue_mode: bool = False
     ) -> 'Logger':
+        # 已创建的实例直接返回，不加锁；只有首次创建时才需要锁
+        instance = cls._instance.get(name)
+        if instance is not None:
+            return instance
 
         with cls._lock:
             if name not in cls._instance:
@@ -92,24 +118,39 @@ class Logger:
                     max_bytes=max_bytes,
                     encoding=encoding,
                     console_output=console_output,
-                    format_string=format_string
+                    format_string=format_string,
+                    queue_mode=queue_mode
                 )
             return cls._instance[name]
 
-    def debug(self, message: str):
-        self.logger.debug(message)
+    @classmethod
+    def shutdown(cls):
+        # 停止后台线程前会先写完队列中剩余的日志
+        for listener in cls._listeners:
+            listener.stop()
+        cls._listeners.clear()
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    # 支持 %-风格参数，级别未启用时不会格式化消息
+    def debug(self, message: str, *args):
+        self.logger.debug(message, *args)
+
+    def info(self, message: str, *args):
+        self.logger.info(message, *args)
+
+    def warning(self, message: str, *args):
+        self.logger.warning(message, *args)
 
-    def info(self, message: str):
-        self.logger.info(message)
+    def error(self, message: str, *args):
+        self.logger.error(message, *args)
 
-    def warning(self, message: str):
-        self.logger.warning(message)
+    def critical(self, message: str, *args):
+        self.logger.critical(message, *args)
 
-    def error(self, message: str):
-        self.logger.error(message)
+    def exception(self, message: str, *args):
+        self.logger.exception(message, *args)
 
-    def critical(self, message: str):
-        self.logger.critical(message)
 
-    def exception(self, message: str):
-        self.logger.exception(message)
+atexit.register(Logger.shutdown)
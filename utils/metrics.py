@@ -0,0 +1,173 @@
+import math
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# 指标只在事件循环线程中写入，/metrics 所在的 Web 线程只读取快照，因此不加锁；
+# 读取时可能看到某个直方图 sum 与 count 相差一个样本，对监控而言可以接受
+
+STALL_SECONDS = 600
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_label(relative_url: str) -> str:
+    # v3/queue/123 -> v3/queue/{id}，避免标签基数失控
+    return _ID_SEGMENT.sub('/{id}', relative_url)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple, object] = {}
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for key, value in list(self.values.items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def remove(self, *labels):
+        self.values.pop(labels, None)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # [各桶计数（非累计，最后一个为 +Inf）, sum, count]
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self, key, value) -> List[str]:
+        counts, total, count = value[0][:], value[1], value[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket
+            le = 'le="' + _format_value(float(bound)) + '"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_seconds = registry.register(Histogram(
+    'sonarr_guard_request_seconds', 'Latency of Sonarr API requests.', ('method', 'endpoint')))
+request_errors = registry.register(Counter(
+    'sonarr_guard_request_errors_total', 'Failed Sonarr API requests.', ('method', 'endpoint', 'status')))
+cycle_seconds = registry.register(Histogram(
+    'sonarr_guard_cycle_seconds', 'Duration of a full queue sweep.', ('instance',)))
+cycles = registry.register(Counter(
+    'sonarr_guard_cycles_total', 'Queue sweeps by result.', ('instance', 'result')))
+rule_seconds = registry.register(Histogram(
+    'sonarr_guard_rule_evaluation_seconds', 'Time spent evaluating rules per sweep.', ('instance',),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)))
+delete_seconds = registry.register(Histogram(
+    'sonarr_guard_delete_seconds', 'Latency of queue delete requests.', ('mode',)))
+deletions = registry.register(Counter(
+    'sonarr_guard_deletions_total', 'Downloads removed from the queue.', ('instance', 'rule', 'status')))
+delete_failures = registry.register(Counter(
+    'sonarr_guard_delete_failures_total', 'Downloads that could not be removed.', ('instance',)))
+evaluated = registry.register(Counter(
+    'sonarr_guard_records_evaluated_total', 'Queue records evaluated.', ('instance',)))
+queue_depth = registry.register(Gauge(
+    'sonarr_guard_queue_depth', 'Records in the queue at the last sweep.', ('instance',)))
+stalled_items = registry.register(Gauge(
+    'sonarr_guard_stalled_items', 'Queue records without progress for at least ten minutes.', ('instance',)))
+last_sweep = registry.register(Gauge(
+    'sonarr_guard_last_sweep_timestamp_seconds', 'Unix time of the last completed sweep.', ('instance',)))
+request_retries = registry.register(Counter(
+    'sonarr_guard_request_retries_total', 'Retried Sonarr API requests.', ('method', 'endpoint')))
+circuit_state = registry.register(Gauge(
+    'sonarr_guard_circuit_state', 'Circuit breaker state per instance (0 closed, 1 half-open, 2 open).', ('instance',)))
+response_bytes = registry.register(Counter(
+    'sonarr_guard_response_bytes_total', 'Response body bytes received from Sonarr, before decompression.',
+    ('endpoint', 'encoding')))
+decoded_bytes = registry.register(Counter(
+    'sonarr_guard_response_decoded_bytes_total', 'Response body bytes after decompression.', ('endpoint',)))
+not_modified = registry.register(Counter(
+    'sonarr_guard_not_modified_total', 'Conditional requests answered with 304 Not Modified.', ('endpoint',)))
+cycle_bytes = registry.register(Histogram(
+    'sonarr_guard_cycle_bytes', 'Bytes received from Sonarr per sweep.', ('instance',),
+    (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)))
+cycle_decode_seconds = registry.register(Histogram(
+    'sonarr_guard_cycle_decode_seconds', 'Time spent decompressing and decoding responses per sweep.', ('instance',),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)))
@@ -0,0 +1,57 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+from utils.queue_item import QueueItem
+
+
+class CachedRecord:
+    __slots__ = ('item', 'changed', 'client')
+
+    def __init__(self, item: QueueItem):
+        self.item = item
+        self.changed = True
+        self.client = None
+
+
+class QueueDiff(NamedTuple):
+    added: Set[int]
+    changed: Set[int]
+    removed: Set[int]
+
+
+class QueueSnapshot:
+    def __init__(self):
+        self.entries: Dict[int, CachedRecord] = {}
+        self._added: Set[int] = set()
+        self._changed: Set[int] = set()
+
+    def update(self, record: Dict) -> CachedRecord:
+        id = record['id']
+        entry: Optional[CachedRecord] = self.entries.get(id)
+
+        if entry is None:
+            entry = self.entries[id] = CachedRecord(QueueItem(record))
+            self._added.add(id)
+        elif not entry.item.same_as(record):
+            # added 没变时沿用已解析的时间
+            previous = entry.item
+            entry.item = QueueItem(record, previous.added if previous.added_text == record['added'] else None)
+            entry.changed = True
+            self._changed.add(id)
+        else:
+            # 未变化的记录不再构建新对象，原始字典随即被释放
+            entry.changed = False
+        return entry
+
+    def finish(self, seen_ids: Iterable[int]) -> QueueDiff:
+        seen = set(seen_ids)
+        removed = {id for id in self.entries if id not in seen}
+        for id in removed:
+            del self.entries[id]
+
+        diff = QueueDiff(self._added, self._changed, removed)
+        self._added = set()
+        self._changed = set()
+        return diff
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,137 @@
+import asyncio
+import math
+from typing import AsyncIterator, Dict, Optional
+
+from utils.api import SonarrAPIError
+from utils.log import Logger
+
+# 流式解析时每条记录保留的字段，其余（如嵌套的剧集、系列信息）直接丢弃
+QUEUE_FIELDS = ('id', 'downloadId', 'title', 'indexer', 'status', 'trackedDownloadState', 'size', 'sizeleft',
+                'added', 'episodeId', 'seriesId', 'movieId')
+
+# 某一页的记录已全部放入队列
+_PAGE_DONE = object()
+
+
+async def probe_queue(api, include_unknown: bool = False) -> Optional[int]:
+    # v3/queue/status 只返回计数，远小于完整队列；旧版本没有该接口时返回 None
+    try:
+        status = await api.get('v3/queue/status')
+    except SonarrAPIError as e:
+        if e.status in (404, 405):
+            Logger.get_logger().info("Queue status endpoint not supported, fetching the queue directly")
+            return None
+        raise
+    if not isinstance(status, dict):
+        return None
+    count = status.get('totalCount' if include_unknown else 'count', status.get('totalCount'))
+    return count if isinstance(count, int) else None
+
+
+async def iter_queue(api, page_size: int = 250, concurrency: int = 4, stream: bool = False,
+                     expected: Optional[int] = None, include_unknown: bool = False) -> AsyncIterator[Dict]:
+    logger = Logger.get_logger()
+
+    if expected == 0:
+        logger.debug("Queue is empty, skipping fetch")
+        return
+
+    params = {
+        'page': 1,
+        'pageSize': page_size,
+        # 固定排序，避免翻页期间记录在页之间移动
+        'sortKey': 'added',
+        'sortDirection': 'ascending',
+        # 只请求需要的内容，不附带系列和剧集详情
+        'includeUnknownSeriesItems': 'true' if include_unknown else 'false',
+        'includeSeries': 'false',
+        'includeEpisode': 'false',
+    }
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    # 所有页边解析边放入有界队列，记录一解析出来就交给规则计算；队列满时各页暂停读取
+    records: asyncio.Queue = asyncio.Queue(maxsize=max(1, page_size))
+    tasks = []
+
+    async def fetch_first():
+        if stream:
+            envelope = {}
+            scheduled = False
+            async for record in api.stream('v3/queue', params, 'records', QUEUE_FIELDS, envelope):
+                # Sonarr 在 records 之前返回 totalRecords，第一页还在解析时就开始请求后续页
+                if not scheduled and 'totalRecords' in envelope:
+                    schedule(envelope['totalRecords'])
+                    scheduled = True
+                await records.put(record)
+
+            if 'records' not in envelope:
+                logger.warning("No records found in queue data")
+                return
+            if not scheduled:
+                schedule(envelope.get('totalRecords', envelope['records']))
+        else:
+            data = await api.get('v3/queue', params)
+
+            if 'records' not in data:
+                logger.warning("No records found in queue data")
+                return
+
+            schedule(data.get('totalRecords', len(data['records'])))
+            for record in data['records']:
+                await records.put(record)
+
+    async def fetch_page(page):
+        async with semaphore:
+            logger.debug("Fetching queue page %d", page)
+            page_params = {**params, 'page': page}
+            if stream:
+                async for record in api.stream('v3/queue', page_params, 'records', QUEUE_FIELDS):
+                    await records.put(record)
+            else:
+                page_data = await api.get('v3/queue', page_params)
+                for record in page_data.get('records', []):
+                    await records.put(record)
+
+    async def feed(fetch, *args):
+        # 每页结束时放入结束标记，出错时把异常交给消费方抛出
+        try:
+            await fetch(*args)
+        except Exception as e:
+            await records.put(e)
+            return
+        await records.put(_PAGE_DONE)
+
+    def schedule(total_records):
+        # 可以多次调用，只补充尚未请求的页
+        total_pages = max(1, math.ceil(total_records / page_size))
+        logger.debug("Queue has %d records across %d pages", total_records, total_pages)
+        tasks.extend(asyncio.create_task(feed(fetch_page, page)) for page in range(len(tasks) + 2, total_pages + 1))
+
+    logger.debug("Fetching queue data from API")
+    seen = set()
+    first = None
+    try:
+        if expected is not None:
+            # 已知总数时所有页与第一页同时请求
+            schedule(expected)
+        first = asyncio.create_task(feed(fetch_first))
+
+        # 后续页只由第一页安排，第一页和所有已安排的页都结束后即完成
+        finished = 0
+        while finished < len(tasks) + 1:
+            record = await records.get()
+            if record is _PAGE_DONE:
+                finished += 1
+                continue
+            if isinstance(record, Exception):
+                raise record
+            # 翻页期间队列可能变化，同一条记录可能出现在两页中
+            if record.get('id') in seen:
+                continue
+            seen.add(record.get('id'))
+            yield record
+    finally:
+        pending = tasks + ([first] if first is not None else [])
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,43 @@
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+
+def parse_added(value: str) -> float:
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _intern(value):
+    # 状态、索引器等取值很少，驻留后所有记录共用同一个字符串，比较时也只需比较指针
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class QueueItem:
+    # 队列记录中规则计算和展示需要的字段，每条记录只解析一次
+    __slots__ = ('id', 'download_id', 'title', 'indexer', 'status', 'tracked_state', 'size', 'size_left',
+                 'added', 'added_text', 'episode_id', 'series_id', 'movie_id')
+
+    def __init__(self, record: Dict, added: Optional[float] = None):
+        self.id = record['id']
+        self.download_id = record.get('downloadId')
+        self.title = record.get('title')
+        self.indexer = _intern(record.get('indexer'))
+        self.status = _intern(record['status'])
+        self.tracked_state = _intern(record.get('trackedDownloadState'))
+        # Sonarr 的大小字段是小数类型，可能以 1479012416.0 的形式返回；速度历史按整数保存
+        self.size = int(record['size'])
+        self.size_left = int(record['sizeleft'])
+        self.added_text = record['added']
+        self.added = parse_added(self.added_text) if added is None else added
+        self.episode_id = record.get('episodeId')
+        self.series_id = record.get('seriesId')
+        self.movie_id = record.get('movieId')
+
+    def same_as(self, record: Dict) -> bool:
+        # 与旧的签名字段一致：大小、剩余大小、状态、跟踪状态和添加时间都没变时视为未变化
+        return (record['sizeleft'] == self.size_left and record['size'] == self.size
+                and record['status'] == self.status and record.get('trackedDownloadState') == self.tracked_state
+                and record['added'] == self.added_text)
+
+    def __repr__(self):
+        return f"QueueItem(id={self.id!r}, title={self.title!r}, status={self.status!r})"
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+from utils.config import file_mode
+from utils.log import Logger
+from utils.queue_item import QueueItem
+
+RESEARCH = 'research'
+SKIP = 'skip'
+DEFER = 'defer'
+
+
+def budget_key(item: QueueItem) -> Optional[str]:
+    # 以剧集为单位计数；没有剧集信息时退回到整部剧或电影
+    if item.episode_id:
+        return f"episode:{item.episode_id}"
+    if item.series_id:
+        return f"series:{item.series_id}"
+    if item.movie_id:
+        return f"movie:{item.movie_id}"
+    return None
+
+
+class ResearchBudget:
+    # 记录每个剧集最近触发重新搜索的时间，限制窗口内的次数和两次之间的间隔
+    def __init__(self, path: str):
+        self.path = path
+        self.removals: Dict[str, Dict[str, List[float]]] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.removals = json.load(file)
+        except (OSError, ValueError) as e:
+            Logger.get_logger().error(f"Failed to load re-search budget state: {str(e)}")
+
+    def save(self):
+        if not self.dirty or not self.path:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            # 先写临时文件再原子替换，进程中途退出也不会留下损坏的状态文件
+            fd, temp_path = tempfile.mkstemp(prefix='.research.', suffix='.tmp', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                os.fchmod(file.fileno(), file_mode(self.path))
+                json.dump(self.removals, file)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            Logger.get_logger().error(f"Failed to save re-search budget state: {str(e)}")
+
+    def _recent(self, instance: str, key: str, now: float, window: float) -> List[float]:
+        entries = self.removals.get(instance, {})
+        timestamps = [ts for ts in entries.get(key, []) if now - ts < window]
+        if timestamps != entries.get(key, []):
+            self.dirty = True
+            if timestamps:
+                entries[key] = timestamps
+            else:
+                entries.pop(key, None)
+        return timestamps
+
+    def decide(self, instance: str, item: QueueItem, now: float, config) -> str:
+        key = budget_key(item)
+        if key is None or config.research_budget <= 0:
+            return RESEARCH
+
+        timestamps = self._recent(instance, key, now, config.research_window_hours * 3600)
+        exhausted = len(timestamps) >= config.research_budget
+        cooling = bool(timestamps) and now - timestamps[-1] < config.research_cooldown * 60
+        if not exhausted and not cooling:
+            return RESEARCH
+        return DEFER if config.research_exhausted_action == DEFER else SKIP
+
+    def record(self, instance: str, item: QueueItem, now: float):
+        key = budget_key(item)
+        if key is None:
+            return
+        self.removals.setdefault(instance, {}).setdefault(key, []).append(now)
+        self.dirty = True
+
+    def release(self, instance: str, item: QueueItem, now: float):
+        # 删除失败时退回预占的额度
+        key = budget_key(item)
+        timestamps = self.removals.get(instance, {}).get(key)
+        if timestamps and now in timestamps:
+            timestamps.remove(now)
+            if not timestamps:
+                del self.removals[instance][key]
+            self.dirty = True
+
+    def prune(self, instance: str, now: float, window: float):
+        # 清理过期的记录，避免状态文件无限增长
+        for key in list(self.removals.get(instance, {})):
+            self._recent(instance, key, now, window)
+
+
+_budgets: Dict[str, ResearchBudget] = {}
+
+
+def get_budget(path: str) -> ResearchBudget:
+    budget = _budgets.get(path)
+    if budget is None:
+        budget = _budgets[path] = ResearchBudget(path)
+    return budget
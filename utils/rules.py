@@ -0,0 +1,147 @@
+import operator
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.log import Logger
+
+
+class Metrics(NamedTuple):
+    elapsed_time: float
+    average_speed: float
+    status: str
+    estimated_time: float
+    percentage_downloaded: float
+    recent_speed: float = 0
+    ewma_speed: float = 0
+    stall_time: float = 0
+    # 下载器实时数据，缺失时为 NaN，任何比较都不成立
+    client_speed: float = float('nan')
+    client_seeds: float = float('nan')
+
+
+class Check(NamedTuple):
+    key: str
+    field: str
+    op: str
+    threshold: object
+    predicate: Callable[[Metrics], bool]
+
+
+# 规则键 -> (指标字段, 比较方式, 阈值换算系数)
+RULE_FIELDS: Dict[str, Tuple[str, str, Optional[float]]] = {
+    "C1": ("elapsed_time", "gt", 60),
+    "C2": ("status", "in", None),
+    "C3": ("average_speed", "lt", 1024),
+    "C4": ("estimated_time", "gt", 1),
+    "C5": ("percentage_downloaded", "lt", 1),
+    "C6": ("recent_speed", "lt", 1024),
+    "C7": ("ewma_speed", "lt", 1024),
+    "C8": ("stall_time", "gt", 60),
+    "C9": ("client_speed", "lt", 1024),
+    "C10": ("client_seeds", "lt", 1),
+}
+
+# 不满足的条件数量统计到此为止：0 表示命中，1 表示只差一个条件
+MISS_LIMIT = 2
+
+# 随时间自然增长的指标，越过阈值的时刻取决于下一次检查何时发生
+TIME_DRIVEN_FIELDS = frozenset(('elapsed_time', 'stall_time'))
+# 唯一未满足的条件进度达到该比例时视为接近触发
+NEAR_CLOSENESS = 0.8
+
+_OPERATORS = {
+    "gt": operator.gt,
+    "lt": operator.lt,
+}
+
+
+class CompiledRules:
+    def __init__(self, checks: Tuple[Check, ...]):
+        self.checks = checks
+
+    def matches(self, metrics: Metrics) -> bool:
+        # 所有启用规则的条件同时满足才删除，遇到第一个不满足的条件立即返回
+        for check in self.checks:
+            if not check.predicate(metrics):
+                return False
+        return True
+
+    def failures(self, metrics: Metrics) -> int:
+        failed = 0
+        for check in self.checks:
+            if not check.predicate(metrics):
+                failed += 1
+                if failed >= MISS_LIMIT:
+                    break
+        return failed
+
+    def closest(self, metrics: Metrics) -> Tuple[int, Optional[str], float]:
+        # 返回不满足的条件数量，以及其中最接近满足的条件与进度（0～1），供界面展示
+        failed = 0
+        key = None
+        best = 0.0
+        for check in self.checks:
+            if check.predicate(metrics):
+                continue
+            failed += 1
+            progress = _progress(check, getattr(metrics, check.field))
+            if key is None or progress > best:
+                key, best = check.key, progress
+        return failed, key, best if failed else 1.0
+
+    def near(self, metrics: Metrics) -> bool:
+        # 只差一个随时间增长的条件，且已接近阈值
+        pending = None
+        for check in self.checks:
+            if check.predicate(metrics):
+                continue
+            if pending is not None:
+                return False
+            pending = check
+        return (pending is not None and pending.field in TIME_DRIVEN_FIELDS
+                and _progress(pending, getattr(metrics, pending.field)) >= NEAR_CLOSENESS)
+
+    def __len__(self):
+        return len(self.checks)
+
+
+def _progress(check: Check, value) -> float:
+    if check.threshold is None or check.op == "in" or value != value:
+        return 0.0
+    if check.op == "gt":
+        return min(1.0, max(0.0, value / check.threshold)) if check.threshold > 0 else 0.0
+    return min(1.0, check.threshold / value) if value > 0 else 0.0
+
+
+def _never(metrics: Metrics) -> bool:
+    return False
+
+
+def compile_check(key: str, value) -> Check:
+    field, op, scale = RULE_FIELDS[key]
+    getter = operator.attrgetter(field)
+
+    if op == "in":
+        statuses = frozenset(part.strip() for part in str(value).split(',') if part.strip())
+        return Check(key, field, op, statuses, lambda m: getter(m) in statuses)
+
+    try:
+        threshold = float(value) * scale
+    except (TypeError, ValueError):
+        Logger.get_logger().warning(f"Invalid threshold for rule {key}: {value!r}, rule will never match")
+        return Check(key, field, op, None, _never)
+
+    compare = _OPERATORS[op]
+    return Check(key, field, op, threshold, lambda m: compare(getter(m), threshold))
+
+
+def compile_rules(rules: Optional[List[Tuple[bool, Dict]]]) -> CompiledRules:
+    checks: List[Check] = []
+    for condition, rule_dict in rules or []:
+        if not condition:
+            continue
+
+        for key, value in rule_dict.items():
+            if key in RULE_FIELDS:
+                checks.append(compile_check(key, value))
+
+    return CompiledRules(tuple(checks))
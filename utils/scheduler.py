@@ -0,0 +1,87 @@
+import asyncio
+import random
+from typing import Optional
+
+from utils.log import Logger
+
+
+class AdaptiveScheduler:
+    def __init__(
+            self,
+            interval: float,
+            min_interval: float = 30,
+            max_interval: float = 1800,
+            error_interval: float = 60,
+    ):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.error_interval = error_interval
+        self.idle_cycles = 0
+        self.failures = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def configure(self, interval: float, min_interval: float, max_interval: float):
+        self.interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+
+    def bind(self):
+        # 必须在事件循环中调用，wake() 可以从任意线程触发
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        if self._loop is None or self._wake is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _jitter(self, delay: float) -> float:
+        return random.uniform(delay / 2, delay)
+
+    def next_delay(self, busy: bool = False, idle: bool = False, failed: bool = False) -> float:
+        if failed:
+            self.failures += 1
+            self.idle_cycles = 0
+            return self._jitter(min(self.max_interval, self.error_interval * 2 ** (self.failures - 1)))
+
+        self.failures = 0
+        if busy:
+            self.idle_cycles = 0
+            return self.min_interval
+
+        if idle:
+            self.idle_cycles += 1
+            return self._jitter(min(self.max_interval, self.interval * 2 ** self.idle_cycles))
+
+        self.idle_cycles = 0
+        return self.interval
+
+    async def sleep(self, delay: float) -> bool:
+        logger = Logger.get_logger()
+        logger.debug("Next queue check in %.1fs", delay)
+
+        if self._wake is None:
+            await asyncio.sleep(delay)
+            return False
+
+        started = asyncio.get_running_loop().time()
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+            # 事件可能成串到达（或在检查期间到达），两轮检查之间至少间隔 min_interval
+            remaining = min(delay, self.min_interval) - (asyncio.get_running_loop().time() - started)
+            if remaining > 0:
+                logger.debug("Scheduler woken up, next check in %.1fs", remaining)
+                await asyncio.sleep(remaining)
+            else:
+                logger.debug("Scheduler woken up before next check")
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._wake.clear()
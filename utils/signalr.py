@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+from typing import Optional
+from urllib.parse import urlencode
+
+import aiohttp
+
+from utils.events import EventInbox
+from utils.log import Logger
+
+RECORD_SEPARATOR = '\x1e'
+PING_INTERVAL = 15
+
+
+class SignalRClient:
+    def __init__(self, api, inbox: EventInbox, instance: Optional[str] = None, max_backoff: float = 300):
+        self.api = api
+        self.inbox = inbox
+        self.instance = instance
+        self.max_backoff = max_backoff
+        self.hub_url = f"{api.server_url}signalr/messages"
+
+    async def run(self):
+        logger = Logger.get_logger()
+        delay = 1.0
+        while True:
+            try:
+                await self._listen()
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"SignalR connection lost: {str(e)}")
+
+            delay = min(self.max_backoff, random.uniform(1.0, delay * 3))
+            logger.debug(f"Reconnecting to SignalR in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _negotiate(self, session) -> str:
+        query = urlencode({'negotiateVersion': 1, 'access_token': self.api.api_key})
+        async with session.post(f"{self.hub_url}/negotiate?{query}", ssl=self.api.ssl) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return data.get('connectionToken') or data['connectionId']
+
+    async def _listen(self):
+        logger = Logger.get_logger()
+        session = self.api.session
+        token = await self._negotiate(session)
+
+        ws_url = self.hub_url.replace('http', 'ws', 1) + '?' + urlencode({'id': token, 'access_token': self.api.api_key})
+        async with session.ws_connect(ws_url, ssl=self.api.ssl) as ws:
+            await ws.send_str(json.dumps({'protocol': 'json', 'version': 1}) + RECORD_SEPARATOR)
+            logger.info("Connected to Sonarr SignalR")
+
+            while True:
+                try:
+                    message = await ws.receive(timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    await ws.send_str(json.dumps({'type': 6}) + RECORD_SEPARATOR)
+                    continue
+
+                if message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.ERROR):
+                    raise ConnectionError('websocket closed')
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+
+                for frame in message.data.split(RECORD_SEPARATOR):
+                    if frame:
+                        self._handle(json.loads(frame))
+
+    def _handle(self, frame):
+        if frame.get('type') == 7:
+            raise ConnectionError(frame.get('error') or 'server closed connection')
+        if frame.get('type') != 1 or frame.get('target') != 'receiveMessage':
+            return
+
+        for argument in frame.get('arguments') or []:
+            name = argument.get('name', '')
+            # queue/status 只是计数变化，每次刷新都会发送，不需要重新检查
+            if not name.startswith('queue') or name == 'queue/status':
+                continue
+
+            body = argument.get('body') or {}
+            resource = body.get('resource') or {}
+            download_id = resource.get('downloadId') if isinstance(resource, dict) else None
+            Logger.get_logger().debug(f"SignalR {name} {body.get('action', '')} event")
+            self.inbox.mark([download_id] if download_id else [], self.instance)
@@ -0,0 +1,84 @@
+from array import array
+from typing import Dict, Iterable, Optional
+
+
+class SpeedRing:
+    __slots__ = ('capacity', 'timestamps', 'sizes', 'head', 'count', 'ewma', 'last_progress')
+
+    def __init__(self, capacity: int):
+        self.capacity = max(2, capacity)
+        # 定长数组环形缓冲区：时间戳（秒）与剩余大小（字节）
+        self.timestamps = array('d', [0.0]) * self.capacity
+        self.sizes = array('q', [0]) * self.capacity
+        self.head = 0
+        self.count = 0
+        self.ewma: Optional[float] = None
+        self.last_progress = 0.0
+
+    def _index(self, age: int) -> int:
+        # age=0 为最新样本
+        return (self.head - 1 - age) % self.capacity
+
+    def append(self, timestamp: float, size_left: int, alpha: float):
+        if self.count:
+            last = self._index(0)
+            last_time = self.timestamps[last]
+            last_size = self.sizes[last]
+            if timestamp <= last_time:
+                return
+
+            speed = max(0.0, (last_size - size_left) / (timestamp - last_time))
+            self.ewma = speed if self.ewma is None else alpha * speed + (1 - alpha) * self.ewma
+            if size_left < last_size:
+                self.last_progress = timestamp
+        else:
+            self.last_progress = timestamp
+
+        self.timestamps[self.head] = timestamp
+        self.sizes[self.head] = size_left
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def recent_speed(self, window: float) -> Optional[float]:
+        if self.count < 2:
+            return None
+
+        newest = self._index(0)
+        newest_time = self.timestamps[newest]
+        oldest = self._index(1)
+        for age in range(2, self.count):
+            index = self._index(age)
+            if newest_time - self.timestamps[index] > window:
+                break
+            oldest = index
+
+        elapsed = newest_time - self.timestamps[oldest]
+        return max(0.0, (self.sizes[oldest] - self.sizes[newest]) / elapsed)
+
+    def stall_time(self) -> float:
+        if not self.count:
+            return 0.0
+        return self.timestamps[self._index(0)] - self.last_progress
+
+
+class SpeedHistory:
+    def __init__(self, size: int = 12, ewma_alpha: float = 0.3):
+        self.size = size
+        self.ewma_alpha = ewma_alpha
+        self.rings: Dict[int, SpeedRing] = {}
+
+    def observe(self, id: int, timestamp: float, size_left: int) -> SpeedRing:
+        ring = self.rings.get(id)
+        if ring is None:
+            ring = self.rings[id] = SpeedRing(self.size)
+        ring.append(timestamp, size_left, self.ewma_alpha)
+        return ring
+
+    def retain(self, ids: Iterable[int]):
+        # 清理已离开队列的下载
+        keep = set(ids)
+        for id in [id for id in self.rings if id not in keep]:
+            del self.rings[id]
+
+    def __len__(self):
+        return len(self.rings)